@@ -1,15 +1,40 @@
-from flask import Flask, request, jsonify, render_template, send_from_directory
+from flask import Flask, Response, request, jsonify, render_template, send_from_directory, stream_with_context
 import json
 import base64
+import hashlib
 import os
+import zipfile
+import tempfile
 from datetime import datetime
 from supabase import create_client, Client
+
+try:
+    import fcntl
+except ImportError:  # Without flock (Windows) there is only the dev server process
+    fcntl = None
 import ocr_service
 import resume_service
-import quiz_service
+import parse_service
+import job_service
+import cache_service
+import auth_service
+import session_store
+import upload_service
+import bulk_ingest
+import mistral_client
+import model_router
+import question_bank
+import quiz_prefetch
+import skill_taxonomy
+import candidate_index
+import reprocess
+import signed_urls
 
 
 app = Flask(__name__)
+# Reject oversized uploads from Content-Length before the body is read.
+# This is the batch limit; /api/parse checks the single-file limit itself.
+app.config['MAX_CONTENT_LENGTH'] = upload_service.MAX_BATCH_UPLOAD_BYTES + upload_service.MULTIPART_OVERHEAD_BYTES
 
 # Initialize Supabase client
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
@@ -20,39 +45,60 @@ if not SUPABASE_URL or not SUPABASE_ANON_KEY:
 
 supabase: Client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
 
-# Store session data (in production, use Redis or database)
-session_data = {}
+# Periodic jobs run in one gunicorn worker per host: whichever takes the lock
+# on BACKGROUND_LOCK_PATH first. Set BACKGROUND_JOBS=0 on all but one host.
+BACKGROUND_JOBS = os.environ.get("BACKGROUND_JOBS", "1") == "1"
+BACKGROUND_LOCK_PATH = os.environ.get(
+    "BACKGROUND_LOCK_PATH", os.path.join(tempfile.gettempdir(), "resume_background.lock"))
+_background_lock = None
+
+def claim_background_jobs():
+    """True if this process runs the periodic background jobs. The lock is
+    held until the process exits, so a restarted worker can take over."""
+    global _background_lock
+    if not BACKGROUND_JOBS:
+        return False
+    if _background_lock is not None or fcntl is None:
+        return True
+    lock_file = open(BACKGROUND_LOCK_PATH, "a")
+    try:
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        return False
+    _background_lock = lock_file
+    return True
+
+if claim_background_jobs():
+    # Keep the question pools of the most common skills filled
+    question_bank.start_warmer()
+    # Re-run stale structuring/scoring in the background, if REPROCESS_INTERVAL is set
+    reprocess.start()
+# Load the semantic matching index in the background (every worker needs its own copy)
+candidate_index.start()
 
 def get_user_from_token(request):
     """Extract and validate user from Authorization header."""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None
-    
-    token = auth_header.split(' ')[1]
-    try:
-        # Create a new client with the user's token
-        user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_client.auth.set_session(token, token)
-        user = user_client.auth.get_user(token)
-        return user.user if user else None
-    except Exception:
-        return None
+    user_client, user = get_authenticated_client(request)
+    return user
 
 def get_authenticated_client(request):
     """Get authenticated Supabase client from request."""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
-        return None, None
-    
-    access_token = auth_header.split(' ')[1]
+    return auth_service.authenticate(auth_service.bearer_token(request))
+
+def encode_cursor(values):
+    """Opaque pagination cursor for the client to send back."""
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor):
+    """Decode a cursor from encode_cursor; invalid or missing cursors start from the top."""
+    if not cursor:
+        return {}
     try:
-        user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_client.auth.set_session(access_token, access_token)
-        user = user_client.auth.get_user(access_token)
-        return user_client, user.user if user else None
-    except Exception:
-        return None, None
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return values if isinstance(values, dict) else {}
+    except (ValueError, UnicodeError):
+        return {}
 
 # Routes
 @app.route('/')
@@ -141,18 +187,19 @@ def register():
         })
         
         if response.user:
+            auth_service.invalidate_role(response.user.id)
             # Check if session is returned (auto-confirmed)
             if response.session:
                 # Create user role entry
                 try:
-                    user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-                    user_client.auth.set_session(response.session.access_token, response.session.access_token)
+                    user_client = auth_service.get_client(response.session.access_token)
                     
                     # Insert role
                     user_client.table('user_roles').insert({
                         "user_id": response.user.id,
                         "role": role
                     }).execute()
+                    auth_service.set_role(response.user.id, role)
                     
                     # Create initial profile
                     if role == 'candidate':
@@ -220,11 +267,8 @@ def login():
             # Get user role
             role = 'candidate'  # Default
             try:
-                user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-                user_client.auth.set_session(response.session.access_token, response.session.access_token)
-                role_result = user_client.table('user_roles').select('role').eq('user_id', response.user.id).execute()
-                if role_result.data:
-                    role = role_result.data[0]['role']
+                user_client = auth_service.get_client(response.session.access_token)
+                role = auth_service.get_role(user_client, response.user) or role
             except Exception as role_error:
                 print(f"Role fetch error: {role_error}")
             
@@ -250,6 +294,9 @@ def login():
 @app.route('/api/auth/logout', methods=['POST'])
 def logout():
     """Log out the current user."""
+    token = auth_service.bearer_token(request)
+    if token:
+        auth_service.invalidate(token)
     try:
         supabase.auth.sign_out()
         return jsonify({"success": True, "message": "Logged out successfully"})
@@ -266,9 +313,7 @@ def get_current_user():
     # Get role
     role = 'candidate'
     try:
-        role_result = user_client.table('user_roles').select('role').eq('user_id', user.id).execute()
-        if role_result.data:
-            role = role_result.data[0]['role']
+        role = auth_service.get_role(user_client, user) or role
     except Exception:
         pass
     
@@ -290,8 +335,7 @@ def get_profile():
     
     try:
         # Get role first
-        role_result = user_client.table('user_roles').select('role').eq('user_id', user.id).execute()
-        role = role_result.data[0]['role'] if role_result.data else 'candidate'
+        role = auth_service.get_role(user_client, user) or 'candidate'
         
         # Get profile based on role
         table = 'candidate_profiles' if role == 'candidate' else 'employer_profiles'
@@ -318,8 +362,7 @@ def update_profile():
     
     try:
         # Get role first
-        role_result = user_client.table('user_roles').select('role').eq('user_id', user.id).execute()
-        role = role_result.data[0]['role'] if role_result.data else 'candidate'
+        role = auth_service.get_role(user_client, user) or 'candidate'
         
         # Update profile based on role using upsert
         table = 'candidate_profiles' if role == 'candidate' else 'employer_profiles'
@@ -367,8 +410,7 @@ def get_user_profile(user_id):
     
     try:
         # Check if current user is employer
-        role_result = user_client.table('user_roles').select('role').eq('user_id', user.id).execute()
-        if not role_result.data or role_result.data[0]['role'] != 'employer':
+        if auth_service.get_role(user_client, user) != 'employer':
             return jsonify({"error": "Only employers can view candidate profiles"}), 403
         
         # Get target user's profile
@@ -426,7 +468,8 @@ def add_skill():
         result = user_client.table('skills').insert({
             "user_id": user.id,
             "skill_name": skill_name,
-            "skill_type": skill_type
+            "skill_type": skill_type,
+            "canonical_skill_id": skill_taxonomy.canonical_id(skill_name)
         }).execute()
         
         return jsonify({"success": True, "skill": result.data[0] if result.data else None})
@@ -461,16 +504,16 @@ def assess_skill(skill_id):
         
         skill = skill_result.data[0]
         
-        # Generate assessment questions
-        assessment = quiz_service.generate_skill_assessment(skill['skill_name'], skill['skill_type'])
+        # Sample questions from the bank (generated on demand for unseen skills)
+        assessment = question_bank.get_assessment(skill['skill_name'], skill['skill_type'])
         
         # Store in session
-        session_id = base64.b64encode(os.urandom(16)).decode('utf-8')
-        session_data[session_id] = {
+        session_id = session_store.new_session_id()
+        session_store.put(session_id, {
             "skill_id": skill_id,
             "skill_name": skill['skill_name'],
             "assessment": assessment
-        }
+        })
         
         # Return questions without answers
         safe_questions = []
@@ -498,10 +541,10 @@ def evaluate_skill_assessment():
     session_id = data.get('session_id')
     answers = data.get('answers', {})
     
-    if not session_id or session_id not in session_data:
+    session = session_store.get(session_id) if session_store.valid_session_id(session_id) else None
+    if not session:
         return jsonify({"error": "Invalid session"}), 400
     
-    session = session_data[session_id]
     assessment = session.get("assessment", {})
     questions = assessment.get("questions", [])
     skill_id = session.get("skill_id")
@@ -542,7 +585,7 @@ def evaluate_skill_assessment():
         print(f"Error updating skill: {e}")
     
     # Clean up session
-    del session_data[session_id]
+    session_store.delete(session_id)
     
     return jsonify({
         "success": True,
@@ -605,14 +648,53 @@ def delete_certificate(cert_id):
         return jsonify({"error": str(e)}), 500
 
 # CV endpoints
+def _run_parse_job(report, user_client, user_id, filename, pdf, mode=None):
+    """Worker-side parse: run the pipeline and keep the results for the quiz flow."""
+    try:
+        parsed = parse_service.run_parse(report, user_client, user_id, filename, pdf.buffer, pdf.path, mode)
+    finally:
+        pdf.close()
+
+    # Store in session
+    session_id = session_store.new_session_id()
+    session_store.put(session_id, {
+        "resume_data": parsed["resume_data"],
+        "score_data": parsed["score_data"],
+        # The OCR text itself is in cv_texts
+        "cv_id": parsed["cv_id"]
+    })
+    # Most users open the quiz next; start generating it now
+    quiz_prefetch.prefetch(parsed["resume_data"])
+
+    return {
+        "session_id": session_id,
+        "cv_id": parsed["cv_id"],
+        "resume_data": parsed["resume_data"],
+        "score_data": parsed["score_data"],
+        "timings": parsed["timings"]
+    }
+
+def _job_payload(job):
+    """Public view of a parse job."""
+    return {
+        "id": job["id"],
+        "status": job["status"],
+        "stage": job["stage"],
+        "progress": job["progress"],
+        "result": job["result"],
+        "error": job["error"]
+    }
+
 @app.route('/api/parse', methods=['POST'])
 def parse_resume():
+    """Queue a resume for parsing and return the job id right away."""
     # REQUIRE authentication
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
+    user_client, user = get_authenticated_client(request)
+    if not user:
         return jsonify({"error": "Authentication required. Please login first."}), 401
     
-    access_token = auth_header.split(' ')[1]
+    if (request.content_length or 0) > upload_service.MAX_UPLOAD_BYTES + upload_service.MULTIPART_OVERHEAD_BYTES:
+        return upload_too_large(None)
     
     if 'file' not in request.files:
         return jsonify({"error": "No file provided"}), 400
@@ -623,167 +705,259 @@ def parse_resume():
 
     cv_title = request.form.get('title', file.filename)
     
+    # "combined" structures and scores in one LLM call; default set by PARSE_MODE
+    mode = request.form.get('mode', parse_service.PARSE_MODE)
+    if mode not in parse_service.PARSE_MODES:
+        return jsonify({"error": f"mode must be one of: {', '.join(parse_service.PARSE_MODES)}"}), 400
+    
+    pdf = None
+    job_id = None
     try:
-        pdf_bytes = file.read()
-        
-        # Extract text using OCR
-        raw_text = ocr_service.extract_resume_with_ocr(pdf_bytes)
-        
-        # Structure the data
-        resume_data = resume_service.structure_resume_data(raw_text)
-        
-        # Score the resume
-        score_data = resume_service.score_resume(resume_data, raw_text)
-        
-        # Store in session
-        session_id = base64.b64encode(os.urandom(16)).decode('utf-8')
-        session_data[session_id] = {
-            "resume_data": resume_data,
-            "score_data": score_data,
-            "raw_text": raw_text
-        }
-        
-        # Save to database (user is authenticated)
-        cv_id = None
-        try:
-            # Create authenticated client
-            user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-            user_client.auth.set_session(access_token, access_token)
-            user = user_client.auth.get_user(access_token)
-            
-            if user and user.user:
-                # 1. Upload file to storage
-                timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                safe_filename = "".join([c for c in file.filename if c.isalnum() or c in "._- "]).strip()
-                file_path = f"{user.user.id}/{timestamp}_{safe_filename}"
-                
-                try:
-                    # Use the already-read pdf_bytes for upload
-                    user_client.storage.from_('resumes').upload(
-                        path=file_path,
-                        file=pdf_bytes,
-                        file_options={"content-type": "application/pdf"}
-                    )
-                except Exception as upload_error:
-                    print(f"Storage upload error: {upload_error}")
-                    # Continue even if upload fails, but file_path will be null
-                    file_path = None
-
-                # 2. Insert into database (only use columns that exist)
-                result = user_client.table('cvs').insert({
-                    "user_id": user.user.id,
-                    "filename": file.filename,
-                    "resume_data": resume_data,
-                    "score_data": score_data,
-                    "file_path": file_path
-                }).execute()
-                
-                if result.data:
-                    cv_id = result.data[0]['id']
-        except Exception as db_error:
-            print(f"Database/Storage error: {db_error}")
+        # Spool to a temp file; the job reads it through a memory map
+        pdf = upload_service.SpooledPDF(file.stream)
+        job_id = job_service.submit(user.id, _run_parse_job, user_client, user.id, file.filename, pdf, mode)
+    except upload_service.UploadTooLargeError as e:
+        return jsonify({"error": str(e)}), 413
+    except job_service.QueueFullError as e:
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '10'
+        return response, 503
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        # Once queued, the job owns the spooled file and closes it when done
+        if job_id is None and pdf:
+            pdf.close()
 
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "status_url": f"/api/parse/jobs/{job_id}"
+    }), 202
+
+# Batch ingest checkpoints, keyed by "<user id>:<batch hash>", and each
+# file's parsed row, keyed by "<user id>:<batch hash>:<pdf hash>"
+_batch_checkpoints = session_store.Namespace("batches")
+_batch_results = session_store.Namespace("batch_results")
+
+def _run_batch_job(report, user_client, user_id, uploads, checkpoint_key):
+    """Worker-side batch ingest; progress is checkpointed in the session store."""
+    archives = []
+    try:
+        sources = []
+        for filename, pdf in uploads:
+            if filename.lower().endswith('.zip'):
+                archive = zipfile.ZipFile(pdf.path)
+                archives.append(archive)
+                sources.extend(bulk_ingest.zip_sources(archive))
+            else:
+                sources.append((filename, lambda pdf=pdf: pdf.buffer))
         
-        return jsonify({
-            "success": True,
-            "session_id": session_id,
-            "cv_id": cv_id,
-            "resume_data": resume_data,
-            "score_data": score_data
-        })
+        checkpoint = _batch_checkpoints.get(checkpoint_key) or bulk_ingest.new_checkpoint()
+        return bulk_ingest.ingest(
+            sources, user_client, user_id, checkpoint,
+            save_checkpoint=lambda cp: _batch_checkpoints.put(checkpoint_key, cp),
+            save_result=lambda pdf_hash, row: _batch_results.put(f"{checkpoint_key}:{pdf_hash}", row),
+            load_result=lambda pdf_hash: _batch_results.get(f"{checkpoint_key}:{pdf_hash}"),
+            report=report
+        )
+    finally:
+        for archive in archives:
+            archive.close()
+        for _, pdf in uploads:
+            pdf.close()
 
+@app.route('/api/parse/batch', methods=['POST'])
+def parse_batch():
+    """Queue many resumes (several PDFs and/or zip archives) as one bulk ingest job."""
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Authentication required. Please login first."}), 401
+    
+    if auth_service.get_role(user_client, user) != 'employer':
+        return jsonify({"error": "Only employers can bulk upload CVs"}), 403
     
+    files = [f for f in request.files.getlist('files') if f.filename]
+    if not files:
+        return jsonify({"error": "No files provided"}), 400
+    
+    uploads = []
+    try:
+        for file in files:
+            limit = (upload_service.MAX_BATCH_UPLOAD_BYTES if file.filename.lower().endswith('.zip')
+                     else upload_service.MAX_UPLOAD_BYTES)
+            uploads.append((file.filename, upload_service.SpooledPDF(file.stream, max_bytes=limit)))
+        
+        # Re-submitting the same set of files resumes from the saved checkpoint
+        batch_hash = cache_service.make_key(*sorted(cache_service.content_hash(pdf.buffer) for _, pdf in uploads))
+        checkpoint_key = f"{user.id}:{batch_hash}"
+        job_id = job_service.submit(user.id, _run_batch_job, user_client, user.id, uploads, checkpoint_key)
+    except upload_service.UploadTooLargeError as e:
+        for _, pdf in uploads:
+            pdf.close()
+        return jsonify({"error": str(e)}), 413
+    except job_service.QueueFullError as e:
+        for _, pdf in uploads:
+            pdf.close()
+        response = jsonify({"error": str(e)})
+        response.headers['Retry-After'] = '30'
+        return response, 503
     except Exception as e:
+        for _, pdf in uploads:
+            pdf.close()
         return jsonify({"error": str(e)}), 500
+    
+    return jsonify({
+        "success": True,
+        "job_id": job_id,
+        "status": "queued",
+        "files": len(uploads),
+        "status_url": f"/api/parse/jobs/{job_id}"
+    }), 202
+
+@app.route('/api/parse/jobs/<job_id>', methods=['GET'])
+def get_parse_job(job_id):
+    """Get the status (and result, once finished) of a parse job."""
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    job = job_service.get_job(job_id, owner_id=user.id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+    
+    return jsonify({"success": True, "job": _job_payload(job)})
+
+@app.route('/api/parse/jobs/<job_id>/events', methods=['GET'])
+def stream_parse_job(job_id):
+    """Stream parse job progress as Server-Sent Events until it finishes."""
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    job = job_service.get_job(job_id, owner_id=user.id)
+    if not job:
+        return jsonify({"error": "Job not found"}), 404
+
+    def events(job):
+        yield f"data: {json.dumps(_job_payload(job))}\n\n"
+        while job["status"] not in ("done", "failed"):
+            version = job["version"]
+            job = job_service.wait_for_change(job_id, version)
+            if not job:
+                break
+            if job["version"] == version:
+                # Keep-alive comment so proxies don't close an idle stream
+                yield ": ping\n\n"
+                continue
+            yield f"data: {json.dumps(_job_payload(job))}\n\n"
+
+    return Response(stream_with_context(events(job)), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
 @app.route('/api/cvs', methods=['GET'])
 def list_cvs():
-    """List all CVs for the authenticated user."""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
+    """List the authenticated user's CVs, newest first, a page at a time."""
+    if not auth_service.bearer_token(request):
         return jsonify({"error": "Authentication required"}), 401
     
-    access_token = auth_header.split(' ')[1]
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Invalid token"}), 401
     
     try:
-        user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_client.auth.set_session(access_token, access_token)
-        user = user_client.auth.get_user(access_token)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        cursor = decode_cursor(request.args.get('cursor'))
         
-        if not user or not user.user:
-            return jsonify({"error": "Invalid token"}), 401
-        
-        # Select only columns that are guaranteed to exist
-        result = user_client.table('cvs').select('id, filename, created_at, score_data').eq('user_id', user.user.id).order('created_at', desc=True).execute()
+        # Scalar columns only: total_score is generated from score_data
+        # (see supabase_setup.sql), so the scoring JSON isn't transferred
+        query = user_client.table('cvs').select(
+            'id, filename, title, created_at, total_score, is_primary, tags'
+        ).eq('user_id', user.id)
+        if cursor.get('created_at') and cursor.get('id'):
+            # Keyset: rows after the cursor in (created_at DESC, id DESC) order
+            created_at, cv_id = json.dumps(cursor['created_at']), json.dumps(cursor['id'])
+            query = query.or_(f'created_at.lt.{created_at},and(created_at.eq.{created_at},id.lt.{cv_id})')
+        result = query.order('created_at', desc=True).order('id', desc=True).limit(limit).execute()
         
         cvs = []
         for cv in result.data:
             cvs.append({
                 "id": cv['id'],
                 "filename": cv['filename'],
-                "title": cv.get('title', cv['filename']),
+                "title": cv.get('title') or cv['filename'],
                 "created_at": cv['created_at'],
-                "score": cv['score_data'].get('total_score') if cv.get('score_data') else None,
-                "is_primary": cv.get('is_primary', False),
-                "tags": cv.get('tags', [])
+                "score": cv.get('total_score'),
+                "is_primary": cv.get('is_primary') or False,
+                "tags": cv.get('tags') or []
             })
         
-        return jsonify({"success": True, "cvs": cvs})
+        next_cursor = None
+        if len(cvs) == limit:
+            next_cursor = encode_cursor({"created_at": cvs[-1]['created_at'], "id": cvs[-1]['id']})
+        
+        response = jsonify({"success": True, "cvs": cvs, "next_cursor": next_cursor})
+        # Lets the CV library skip re-rendering an unchanged page (304 Not Modified)
+        response.set_etag(hashlib.sha256(response.get_data()).hexdigest()[:32])
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response.make_conditional(request)
         
     except Exception as e:
         print(f"list_cvs error: {e}")
         return jsonify({"error": str(e)}), 500
 
+# Fields get_cv returns by default; ?fields= picks a subset
+CV_FIELDS = ('filename', 'title', 'resume_data', 'score_data', 'created_at', 'is_primary', 'tags')
+
 @app.route('/api/cvs/<cv_id>', methods=['GET'])
 def get_cv(cv_id):
-    """Get a specific CV by ID."""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
+    """Get a specific CV by ID.
+
+    ?fields=resume_data,score_data returns only those fields (plus id), and
+    ?include=pdf_url adds a signed download URL for the PDF.
+    """
+    if not auth_service.bearer_token(request):
         return jsonify({"error": "Authentication required"}), 401
     
-    access_token = auth_header.split(' ')[1]
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Invalid token"}), 401
+    
+    fields = [f.strip() for f in request.args.get('fields', '').split(',') if f.strip()] or list(CV_FIELDS)
+    unknown = [f for f in fields if f not in CV_FIELDS]
+    if unknown:
+        return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+    include_pdf_url = 'pdf_url' in request.args.get('include', '').split(',')
     
     try:
-        user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_client.auth.set_session(access_token, access_token)
-        user = user_client.auth.get_user(access_token)
+        columns = {'id'} | set(fields)
+        if 'title' in fields:
+            columns.add('filename')  # title falls back to the filename
+        if include_pdf_url:
+            columns.add('file_path')
+        result = user_client.table('cvs').select(', '.join(sorted(columns))).eq('id', cv_id).execute()
         
-        if not user or not user.user:
-            return jsonify({"error": "Invalid token"}), 401
+        if not result.data:
+            return jsonify({"error": "CV not found"}), 404
         
-        result = user_client.table('cvs').select('*').eq('id', cv_id).execute()
+        row = result.data[0]
+        cv = {"id": row['id']}
+        for field in fields:
+            cv[field] = row.get(field)
+        if 'title' in fields:
+            cv['title'] = row.get('title') or row['filename']
+        if 'is_primary' in fields:
+            cv['is_primary'] = row.get('is_primary') or False
+        if 'tags' in fields:
+            cv['tags'] = row.get('tags') or []
+        if include_pdf_url:
+            # Signed URLs are cached per file until shortly before they expire
+            cv['pdf_url'] = signed_urls.get(user_client, row['file_path']) if row.get('file_path') else None
         
-        if result.data:
-            cv = result.data[0]
-            # Generate signed URL for the PDF if it exists
-            pdf_url = None
-            if cv.get('file_path'):
-                try:
-                    url_response = user_client.storage.from_('resumes').create_signed_url(
-                        result.data['file_path'], 
-                        3600 # 1 hour expiry
-                    )
-                    pdf_url = url_response.get('signedURL')
-                except Exception as e:
-                    print(f"Error generating signed URL: {e}")
-
-            return jsonify({
-                "success": True,
-                "cv": {
-                    "id": result.data['id'],
-                    "filename": result.data['filename'],
-                    "title": result.data.get('title', result.data['filename']),
-                    "resume_data": result.data['resume_data'],
-                    "score_data": result.data['score_data'],
-                    "created_at": result.data['created_at'],
-                    "is_primary": result.data.get('is_primary', False),
-                    "tags": result.data.get('tags', []),
-                    "pdf_url": pdf_url
-                }
-            })
-
-        else:
-            return jsonify({"error": "CV not found"}), 404
+        return jsonify({"success": True, "cv": cv})
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
@@ -791,21 +965,19 @@ def get_cv(cv_id):
 @app.route('/api/cvs/<cv_id>', methods=['DELETE'])
 def delete_cv(cv_id):
     """Delete a specific CV by ID."""
-    auth_header = request.headers.get('Authorization')
-    if not auth_header or not auth_header.startswith('Bearer '):
+    if not auth_service.bearer_token(request):
         return jsonify({"error": "Authentication required"}), 401
     
-    access_token = auth_header.split(' ')[1]
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Invalid token"}), 401
     
     try:
-        user_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
-        user_client.auth.set_session(access_token, access_token)
-        user = user_client.auth.get_user(access_token)
-        
-        if not user or not user.user:
-            return jsonify({"error": "Invalid token"}), 401
-        
         result = user_client.table('cvs').delete().eq('id', cv_id).execute()
+        if result.data:
+            candidate_index.remove(cv_id)
+            if result.data[0].get('file_path'):
+                signed_urls.forget(result.data[0]['file_path'])
         
         return jsonify({"success": True, "message": "CV deleted successfully"})
         
@@ -840,8 +1012,7 @@ def search_candidates():
     
     try:
         # Check if user is employer
-        role_result = user_client.table('user_roles').select('role').eq('user_id', user.id).execute()
-        if not role_result.data or role_result.data[0]['role'] != 'employer':
+        if auth_service.get_role(user_client, user) != 'employer':
             return jsonify({"error": "Only employers can search candidates"}), 403
         
         # Get filter parameters
@@ -851,84 +1022,156 @@ def search_candidates():
         experience = request.args.get('experience')
         skills = request.args.getlist('skills')
         min_skill_score = request.args.get('min_skill_score', 0, type=int)
+        limit = min(max(request.args.get('limit', 20, type=int), 1), 100)
+        cursor = decode_cursor(request.args.get('cursor'))
         
-        # Build query for candidates
-        query = user_client.table('candidate_profiles').select('*')
+        try:
+            graduation_year = int(graduation_year) if graduation_year else None
+        except ValueError:
+            graduation_year = None
         
         print(f"DEBUG: Search filters - Major: {major}, Location: {location}, GradYear: {graduation_year}, Exp: {experience}, Skills: {skills}, MinScore: {min_skill_score}")
 
-        if major:
-            query = query.ilike('major_specialization', f'%{major}%')
-        if location:
-            query = query.ilike('location', f'%{location}%')
-        if graduation_year:
-            try:
-                query = query.eq('graduation_year', int(graduation_year))
-            except: pass
-        if experience:
-            query = query.eq('years_of_experience', experience)
+        # Known skills are filtered by canonical id; names the taxonomy
+        # doesn't know are still matched by name
+        skill_ids, unmapped_skills = skill_taxonomy.split_filter(skills)
+
+        # Ranked page from the precomputed candidate_search table
+        # (see search_candidates in supabase_setup.sql)
+        result = user_client.rpc('search_candidates', {
+            "p_major": major or None,
+            "p_location": location or None,
+            "p_graduation_year": graduation_year,
+            "p_experience": experience or None,
+            "p_skills": unmapped_skills or None,
+            "p_skill_ids": skill_ids or None,
+            "p_min_skill_score": min_skill_score,
+            "p_limit": limit,
+            "p_cursor_relevance": cursor.get('relevance'),
+            "p_cursor_score": cursor.get('score'),
+            "p_cursor_user_id": cursor.get('user_id')
+        }).execute()
         
-        candidates_result = query.execute()
-        print(f"DEBUG: Found {len(candidates_result.data)} raw candidate profiles matching basic filters")
+        candidates = []
+        for candidate in result.data:
+            candidates.append({
+                "user_id": candidate['user_id'],
+                "full_name": candidate.get('full_name', 'Anonymous'),
+                "professional_headline": candidate.get('professional_headline', ''),
+                "location": candidate.get('location', ''),
+                "major_specialization": candidate.get('major_specialization', ''),
+                "graduation_year": candidate.get('graduation_year'),
+                "years_of_experience": candidate.get('years_of_experience', ''),
+                "skills": candidate.get('skills') or [],  # Top 5 skills
+                "average_score": candidate.get('average_score') or 0,
+                "relevance": candidate.get('relevance') or 0
+            })
+        
+        next_cursor = None
+        if len(candidates) == limit:
+            last = candidates[-1]
+            next_cursor = encode_cursor({
+                "relevance": last['relevance'],
+                "score": last['average_score'],
+                "user_id": last['user_id']
+            })
+        
+        return jsonify({"success": True, "candidates": candidates, "next_cursor": next_cursor})
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/candidates/match', methods=['POST'])
+def match_candidates():
+    """Rank candidates against a job description by resume similarity (for employers)."""
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    if not candidate_index.enabled():
+        return jsonify({"error": "Candidate matching is not configured"}), 503
+    
+    try:
+        if auth_service.get_role(user_client, user) != 'employer':
+            return jsonify({"error": "Only employers can match candidates"}), 403
+        
+        data = request.json or {}
+        job_description = (data.get('job_description') or '').strip()
+        if not job_description:
+            return jsonify({"error": "Job description is required"}), 400
+        try:
+            limit = min(max(int(data.get('limit', 20)), 1), candidate_index.MATCH_MAX_RESULTS)
+        except (TypeError, ValueError):
+            return jsonify({"error": "Invalid limit"}), 400
+        
+        # Ask for a few extra: CV owners without a candidate profile are dropped below
+        matches = candidate_index.match(job_description, limit * 2)
+        profiles = {}
+        if matches:
+            result = user_client.table('candidate_search').select('*').in_(
+                'user_id', [m['user_id'] for m in matches]).execute()
+            profiles = {row['user_id']: row for row in result.data or []}
         
-        # Enhance with skills data
         candidates = []
-        for candidate in candidates_result.data:
-            # Get skills for this candidate
-            skills_result = user_client.table('skills').select('*').eq('user_id', candidate['user_id']).execute()
-            candidate_skills = skills_result.data
-            
-            print(f"DEBUG: Candidate {candidate['user_id']} has {len(candidate_skills)} skills")
-
-            # Filter by skills if specified
-            if skills:
-                candidate_skill_names = [s['skill_name'].lower().strip() for s in candidate_skills]
-                match = False
-                for s_filter in skills:
-                    if s_filter.lower().strip() in candidate_skill_names:
-                        match = True
-                        break
-                if not match:
-                    print(f"DEBUG: Candidate {candidate['user_id']} filtered out due to skill mismatch")
-                    continue
-            
-            # Calculate average verified skill score
-            verified_skills = [s for s in candidate_skills if s.get('is_verified')]
-            avg_score = sum(s['score'] for s in verified_skills) / len(verified_skills) if verified_skills else 0
-            
-            if avg_score < min_skill_score:
-                print(f"DEBUG: Candidate {candidate['user_id']} filtered out due to low score: {avg_score} < {min_skill_score}")
+        for m in matches:
+            candidate = profiles.get(m['user_id'])
+            if not candidate:
                 continue
-            
             candidates.append({
                 "user_id": candidate['user_id'],
                 "full_name": candidate.get('full_name', 'Anonymous'),
                 "professional_headline": candidate.get('professional_headline', ''),
                 "location": candidate.get('location', ''),
+                "major_specialization": candidate.get('major_specialization', ''),
+                "graduation_year": candidate.get('graduation_year'),
                 "years_of_experience": candidate.get('years_of_experience', ''),
-                "skills": candidate_skills[:5],  # Top 5 skills
-                "average_score": int(avg_score)
+                "skills": candidate.get('top_skills') or [],
+                "average_score": candidate.get('verified_avg_score') or 0,
+                "cv_id": m['cv_id'],
+                "similarity": m['similarity']
             })
+            if len(candidates) == limit:
+                break
         
         return jsonify({"success": True, "candidates": candidates})
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Job queue, cache, OCR, Mistral API, model routing, question bank, quiz prefetch, skill taxonomy, candidate index and reprocessing counters for this worker."""
+    user_client, user = get_authenticated_client(request)
+    if not user:
+        return jsonify({"error": "Not authenticated"}), 401
+    
+    return jsonify({
+        "success": True,
+        "jobs": job_service.stats(),
+        "cache": cache_service.stats(),
+        "ocr": ocr_service.stats(),
+        "mistral": mistral_client.stats(),
+        "models": model_router.stats(),
+        "question_bank": question_bank.stats(),
+        "quiz_prefetch": quiz_prefetch.stats(),
+        "skill_taxonomy": skill_taxonomy.stats(),
+        "candidate_index": candidate_index.stats(),
+        "reprocess": reprocess.stats()
+    })
+
 # Quiz endpoints (kept for backward compatibility)
 @app.route('/api/quiz', methods=['POST'])
 def get_quiz():
     data = request.json
     session_id = data.get('session_id')
     
-    if not session_id or session_id not in session_data:
+    session = session_store.get(session_id) if session_store.valid_session_id(session_id) else None
+    if not session:
         return jsonify({"error": "Invalid session"}), 400
     
     try:
-        resume_data = session_data[session_id]["resume_data"]
-        quiz_data = quiz_service.generate_quiz(resume_data)
+        resume_data = session["resume_data"]
+        quiz_data = quiz_prefetch.get_quiz(resume_data)
         
         # Store quiz for evaluation
-        session_data[session_id]["quiz"] = quiz_data
+        session_store.update(session_id, quiz=quiz_data)
         
         # Return questions without correct answers
         safe_questions = []
@@ -947,13 +1190,14 @@ def evaluate_quiz():
     session_id = data.get('session_id')
     answers = data.get('answers', {})
     
-    if not session_id or session_id not in session_data:
+    session = session_store.get(session_id) if session_store.valid_session_id(session_id) else None
+    if not session:
         return jsonify({"error": "Invalid session"}), 400
     
-    if "quiz" not in session_data[session_id]:
+    if "quiz" not in session:
         return jsonify({"error": "Quiz not found"}), 400
     
-    quiz = session_data[session_id]["quiz"]
+    quiz = session["quiz"]
     results = []
     correct_count = 0
     
@@ -985,5 +1229,10 @@ def evaluate_quiz():
         "results": results
     })
 
+@app.errorhandler(413)
+def upload_too_large(e):
+    limit_mb = upload_service.MAX_UPLOAD_BYTES // (1024 * 1024)
+    return jsonify({"error": f"File is larger than the {limit_mb} MB limit"}), 413
+
 if __name__ == '__main__':
     app.run(debug=True, port=5000)
@@ -0,0 +1,242 @@
+import os
+import json
+import hmac
+import time
+import base64
+import hashlib
+import threading
+from collections import OrderedDict, namedtuple
+import httpx
+from postgrest import SyncPostgrestClient
+from storage3 import SyncStorageClient
+from supabase import create_client
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
+# Project JWT secret (Settings > API). When unset, tokens are checked remotely and cached.
+SUPABASE_JWT_SECRET = os.environ.get("SUPABASE_JWT_SECRET")
+
+if not SUPABASE_URL or not SUPABASE_ANON_KEY:
+    raise ValueError("SUPABASE_URL or SUPABASE_ANON_KEY not found in environment variables")
+
+AUTH_CACHE_TTL = int(os.environ.get("AUTH_CACHE_TTL", "60"))
+AUTH_CACHE_MAX = int(os.environ.get("AUTH_CACHE_MAX", "1024"))
+ROLE_CACHE_TTL = int(os.environ.get("ROLE_CACHE_TTL", "300"))
+USER_CLIENT_TIMEOUT = float(os.environ.get("USER_CLIENT_TIMEOUT", "120"))
+
+AuthUser = namedtuple("AuthUser", ["id", "email", "role"])
+
+# Shared client for remote token checks; never given a user session
+_verifier = create_client(SUPABASE_URL, SUPABASE_ANON_KEY)
+# One keep-alive connection pool per worker for every user's table and storage
+# requests; each UserClient sends its own token as a per-request header
+_http = httpx.Client(timeout=USER_CLIENT_TIMEOUT, follow_redirects=True)
+
+# sha256(token) -> {"expires_at", "user"}, least recently used first
+_cache = OrderedDict()
+# user id -> (expires_at, role); role is None when the user has no user_roles row
+_roles = {}
+_lock = threading.Lock()
+
+# verify_jwt() result for a token that can only be checked by Supabase itself
+VERIFY_REMOTELY = object()
+
+
+def bearer_token(request):
+    """Return the bearer token from the Authorization header, or None."""
+    auth_header = request.headers.get('Authorization')
+    if not auth_header or not auth_header.startswith('Bearer '):
+        return None
+    return auth_header.split(' ')[1]
+
+
+def _token_key(token):
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+def _b64url_decode(segment):
+    return base64.urlsafe_b64decode(segment + "=" * (-len(segment) % 4))
+
+
+def verify_jwt(token):
+    """Verify an HS256 Supabase access token locally and return its claims.
+
+    Returns None if the token is malformed, expired or signed incorrectly,
+    and VERIFY_REMOTELY when it can't be checked locally (no secret
+    configured, or an asymmetric signing algorithm).
+    """
+    try:
+        header_b64, payload_b64, signature_b64 = token.split(".")
+        header = json.loads(_b64url_decode(header_b64))
+        claims = json.loads(_b64url_decode(payload_b64))
+        signature = _b64url_decode(signature_b64)
+    except ValueError:
+        return None
+    if not isinstance(header, dict) or not isinstance(claims, dict):
+        return None
+
+    if not SUPABASE_JWT_SECRET or header.get("alg") != "HS256":
+        return VERIFY_REMOTELY
+
+    expected = hmac.new(SUPABASE_JWT_SECRET.encode("utf-8"),
+                        f"{header_b64}.{payload_b64}".encode("ascii"),
+                        hashlib.sha256).digest()
+    if not hmac.compare_digest(expected, signature):
+        return None
+    exp = claims.get("exp")
+    if not isinstance(exp, (int, float)) or exp <= time.time():
+        return None
+    if claims.get("aud") != "authenticated" or not claims.get("sub"):
+        return None
+    return claims
+
+
+def _identify(token):
+    """Validate a token, locally if possible. Returns (user, expires_at) or (None, None)."""
+    claims = verify_jwt(token)
+    if claims is None:
+        return None, None
+    if claims is not VERIFY_REMOTELY:
+        user = AuthUser(id=claims["sub"], email=claims.get("email"), role=None)
+        return user, min(claims["exp"], time.time() + AUTH_CACHE_TTL)
+
+    try:
+        response = _verifier.auth.get_user(token)
+    except Exception:
+        return None, None
+    if not response or not response.user:
+        return None, None
+    user = AuthUser(id=response.user.id, email=response.user.email, role=None)
+    return user, time.time() + AUTH_CACHE_TTL
+
+
+def _cached_entry(token):
+    key = _token_key(token)
+    now = time.time()
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry["expires_at"] > now:
+            _cache.move_to_end(key)
+            return entry
+        _cache.pop(key, None)
+
+    user, expires_at = _identify(token)
+    if not user:
+        return None
+
+    entry = {"expires_at": expires_at, "user": user}
+    with _lock:
+        _cache[key] = entry
+        while len(_cache) > AUTH_CACHE_MAX:
+            _cache.popitem(last=False)
+    return entry
+
+
+class UserClient:
+    """Tables, RPCs and storage acting as one user, over the shared pool.
+
+    Unlike a supabase-py client given the session with set_session(), this
+    makes no auth round trip: the token (already verified by authenticate(),
+    or checked by PostgREST/Storage themselves) is only sent as a header.
+    """
+
+    def __init__(self, token):
+        headers = {"apikey": SUPABASE_ANON_KEY, "Authorization": f"Bearer {token}"}
+        self.postgrest = SyncPostgrestClient(f"{SUPABASE_URL}/rest/v1", headers=headers, http_client=_http)
+        self.storage = SyncStorageClient(f"{SUPABASE_URL}/storage/v1/", headers, http_client=_http)
+
+    def table(self, table_name):
+        return self.postgrest.from_(table_name)
+
+    from_ = table
+
+    def rpc(self, fn, params=None):
+        return self.postgrest.rpc(fn, params or {})
+
+
+def get_client(token):
+    """Client acting as the token's user. Cheap to build: it holds no connections."""
+    return UserClient(token)
+
+
+def sign_in(email, password):
+    """Sign in with email and password (e.g. for CLI tools) and return the session."""
+    response = create_client(SUPABASE_URL, SUPABASE_ANON_KEY).auth.sign_in_with_password({
+        "email": email,
+        "password": password
+    })
+    if not response.session:
+        raise ValueError("Sign in failed")
+    return response.session
+
+
+def authenticate(token):
+    """Return (user_client, AuthUser) for a valid token, or (None, None)."""
+    if not token:
+        return None, None
+    entry = _cached_entry(token)
+    if entry is None:
+        return None, None
+    user_client = UserClient(token)
+
+    user = entry["user"]
+    if user.role is None:
+        role = _cached_role(user.id)
+        if role is not None:
+            user = entry["user"] = user._replace(role=role)
+    return user_client, user
+
+
+def invalidate(token):
+    """Forget a token, e.g. on logout."""
+    with _lock:
+        _cache.pop(_token_key(token), None)
+
+
+def _cached_role(user_id):
+    with _lock:
+        cached = _roles.get(user_id)
+    if cached and cached[0] > time.time():
+        return cached[1]
+    return None
+
+
+def get_role(user_client, user):
+    """Return the user's role ('candidate'/'employer'), or None if none is set.
+
+    Looked up in user_roles once per ROLE_CACHE_TTL and shared by every
+    endpoint and token of that user.
+    """
+    # Supabase's own User objects carry role="authenticated", so only trust ours
+    if isinstance(user, AuthUser) and user.role:
+        return user.role
+
+    user_id = user.id
+    with _lock:
+        cached = _roles.get(user_id)
+    if cached and cached[0] > time.time():
+        return cached[1]
+
+    role_result = user_client.table('user_roles').select('role').eq('user_id', user_id).execute()
+    role = role_result.data[0]['role'] if role_result.data else None
+    set_role(user_id, role)
+    return role
+
+
+def set_role(user_id, role):
+    """Record a user's role, e.g. right after it is written on registration."""
+    with _lock:
+        # Re-insert so dict order stays oldest-write first for eviction
+        _roles.pop(user_id, None)
+        _roles[user_id] = (time.time() + ROLE_CACHE_TTL, role)
+        while len(_roles) > AUTH_CACHE_MAX:
+            del _roles[next(iter(_roles))]
+
+
+def invalidate_role(user_id):
+    """Forget a cached role so the next lookup reads user_roles again."""
+    with _lock:
+        _roles.pop(user_id, None)
+        for entry in _cache.values():
+            if entry["user"].id == user_id:
+                entry["user"] = entry["user"]._replace(role=None)
@@ -0,0 +1,77 @@
+"""Latency and token cost of the two structuring/scoring modes.
+
+"separate" is structure_resume_data followed by score_resume (two LLM
+calls); "combined" is structure_and_score_resume (one call). Both run
+against the real Mistral API, bypassing the result cache, on the same
+inputs as bench_prompt_size.py. Needs MISTRAL_API_KEY (or
+MISTRAL_SERVER_URL pointing at a stub server).
+
+    python benchmarks/bench_parse_modes.py [DIR] [--runs 1]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_prompt_size import load_texts
+
+
+def separate(resume_service, text):
+    resume_data = resume_service.structure_resume_data(text)
+    resume_service.score_resume(resume_data, text)
+
+
+def combined(resume_service, text):
+    resume_service.structure_and_score_resume(text)
+
+
+def measure(fn, resume_service, mistral_client, text):
+    before = mistral_client.stats()
+    t0 = time.perf_counter()
+    fn(resume_service, text)
+    elapsed = time.perf_counter() - t0
+    after = mistral_client.stats()
+    return {
+        "seconds": elapsed,
+        "calls": after["calls"] - before["calls"],
+        "prompt_tokens": after["prompt_tokens"] - before["prompt_tokens"],
+        "completion_tokens": after["completion_tokens"] - before["completion_tokens"],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?", help="Directory of .txt/.md OCR outputs")
+    parser.add_argument("--runs", type=int, default=1)
+    args = parser.parse_args()
+
+    import mistral_client
+    import resume_service
+
+    totals = {}
+    texts = load_texts(args.directory)
+    for name, text in texts:
+        for run in range(args.runs):
+            modes = [("separate", separate), ("combined", combined)]
+            # Alternate the order so neither mode always runs first
+            for mode, fn in (modes if run % 2 == 0 else modes[::-1]):
+                result = measure(fn, resume_service, mistral_client, text)
+                print(f"{name[:14]:14s} {mode:8s} {result['seconds']:6.1f}s  {result['calls']} calls  "
+                      f"{result['prompt_tokens']:6d} in  {result['completion_tokens']:6d} out")
+                total = totals.setdefault(mode, dict.fromkeys(result, 0))
+                for key, value in result.items():
+                    total[key] += value
+
+    count = len(texts) * args.runs
+    print()
+    for mode, total in totals.items():
+        print(f"{mode:8s} mean {total['seconds'] / count:6.1f}s  "
+              f"{total['prompt_tokens'] / count:8.0f} prompt tokens  "
+              f"{total['completion_tokens'] / count:8.0f} completion tokens  "
+              f"{total['calls'] / count:.1f} calls per resume")
+
+
+if __name__ == "__main__":
+    main()
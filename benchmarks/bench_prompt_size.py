@@ -0,0 +1,117 @@
+"""Structuring prompt size with and without the local pre-parser.
+
+Builds the structure_resume_data prompt both ways for each resume and
+reports characters, estimated tokens (~4 characters per token) and the time
+the pre-parser itself takes. No API calls are made.
+
+Resumes are read from a directory of .txt/.md OCR outputs, or by default
+from the OCR entries in the resume cache; a built-in sample is used if
+neither has anything.
+
+    python benchmarks/bench_prompt_size.py [DIR]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The client is created at import time but never called here
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+SAMPLE = """
+--- Page 1 ---
+# JANE DOE
+Cairo, Egypt | jane.doe@example.com | +20 100 123 4567
+linkedin.com/in/jane-doe
+
+![img-0.jpeg](img-0.jpeg)
+
+## PROFESSIONAL SUMMARY
+Data engineer with five years of experience building batch and streaming
+pipelines on AWS. Reduced warehouse costs by 40% through partitioning.
+
+## WORK EXPERIENCE
+**Acme Corp** | Senior Data Engineer | Jan 2021 - Present | Cairo
+- Designed a Kafka-based ingestion layer processing 2M events/day
+- Led migration from cron jobs to Airflow, cutting failures by 70%
+
+**Globex** | Data Engineer | 2019 - 2021 | Alexandria
+- Built ETL jobs in PySpark for the finance team
+- Maintained the Redshift warehouse and its dbt models
+
+--- Page 2 ---
+## EDUCATION
+B.Sc. Computer Science, Cairo University, 2015 - 2019, GPA 3.6
+
+## SKILLS
+Python, SQL, PySpark, Airflow, Kafka, dbt, AWS, Docker, communication
+
+## CERTIFICATIONS
+AWS Certified Data Analytics - Specialty (2022)
+
+## LANGUAGES
+Arabic (native), English (fluent)
+
+## REFERENCES
+John Smith, Head of Data, Acme Corp, john.smith@example.com, +20 111 222 3333
+
+## HOBBIES
+Chess, running, photography
+"""
+
+
+def load_texts(directory):
+    if directory:
+        paths = sorted(glob.glob(os.path.join(directory, "*.txt")) + glob.glob(os.path.join(directory, "*.md")))
+        texts = []
+        for path in paths:
+            with open(path, "r", encoding="utf-8") as f:
+                texts.append((os.path.basename(path), f.read()))
+        return texts
+
+    import cache_service
+    texts = []
+    for path in sorted(glob.glob(os.path.join(cache_service.CACHE_DIR, "ocr", "*", "*.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            texts.append((os.path.basename(path)[:12], json.load(f)))
+    return texts or [("sample", SAMPLE)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", nargs="?", help="Directory of .txt/.md OCR outputs")
+    args = parser.parse_args()
+
+    import resume_preparse
+    import resume_service
+
+    totals = {"full": 0, "preparsed": 0, "seconds": 0.0}
+    texts = load_texts(args.directory)
+    print(f"{'resume':14s} {'full chars':>10s} {'pre chars':>10s} {'~tokens saved':>14s} {'preparse':>10s}")
+    for name, text in texts:
+        resume_service.LOCAL_PREPARSE = False
+        full_prompt, _ = resume_service.build_structure_prompt(text)
+        resume_service.LOCAL_PREPARSE = True
+        t0 = time.perf_counter()
+        resume_preparse.preparse(text)
+        elapsed = time.perf_counter() - t0
+        short_prompt, known = resume_service.build_structure_prompt(text)
+
+        totals["full"] += len(full_prompt)
+        totals["preparsed"] += len(short_prompt)
+        totals["seconds"] += elapsed
+        print(f"{name[:14]:14s} {len(full_prompt):10d} {len(short_prompt):10d} "
+              f"{(len(full_prompt) - len(short_prompt)) // 4:14d} {elapsed * 1e6:8.0f}us"
+              f"   local: {', '.join(sorted(known)) or '-'}")
+
+    saved = 1 - totals["preparsed"] / totals["full"] if totals["full"] else 0
+    print(f"\n{len(texts)} resumes: {totals['full']} -> {totals['preparsed']} prompt chars "
+          f"({saved:.0%} smaller, ~{(totals['full'] - totals['preparsed']) // 4} tokens), "
+          f"pre-parse {totals['seconds'] / max(1, len(texts)) * 1e6:.0f}us per resume")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""Peak memory of the /api/parse upload path, before and after spooling.
+
+Each variant runs in its own subprocess so ru_maxrss is not shared. The
+upload starts as a temp file on disk, as werkzeug leaves large multipart
+files. No network calls are made: the OCR request is represented by the
+data URI str handed to the Mistral client, and the storage upload by the
+object passed to storage.upload().
+
+    python benchmarks/bench_upload_memory.py [--size-mb 8]
+"""
+import argparse
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def legacy(upload):
+    """file.read(), then b64encode/decode/f-string as extract_resume_with_ocr did."""
+    import base64
+    pdf_bytes = upload.read()
+    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
+    uri = f"data:application/pdf;base64,{pdf_base64}"
+    storage_body = pdf_bytes
+    return len(uri) + len(storage_body)
+
+
+def spooled(upload):
+    """SpooledPDF + pdf_data_uri; the storage upload is given the temp file path."""
+    from upload_service import SpooledPDF, pdf_data_uri
+    pdf = SpooledPDF(upload, max_bytes=float("inf"))
+    try:
+        uri = pdf_data_uri(pdf.buffer)
+        storage_body = pdf.path
+        return len(uri) + len(storage_body)
+    finally:
+        pdf.close()
+
+
+def run_variant(name, size_mb):
+    with tempfile.TemporaryFile() as upload:
+        upload.write(os.urandom(size_mb * 1024 * 1024))
+        upload.seek(0)
+        base_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        tracemalloc.start()
+        globals()[name](upload)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    print(f"{name:8s} python-heap peak {peak / 2**20:7.1f} MiB   "
+          f"max RSS growth {(rss - base_rss) / 1024:7.1f} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=int, default=8)
+    parser.add_argument("--variant")
+    args = parser.parse_args()
+
+    if args.variant:
+        run_variant(args.variant, args.size_mb)
+        return
+
+    print(f"Upload size: {args.size_mb} MiB")
+    for name in ("legacy", "spooled"):
+        subprocess.run([sys.executable, os.path.abspath(__file__),
+                        "--size-mb", str(args.size_mb), "--variant", name], check=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""Query latency of the in-memory candidate index.
+
+Fills candidate_index.VectorIndex with random unit vectors (several CVs per
+candidate, like the real index) and times top-k searches. No API or database
+calls are made.
+
+    python benchmarks/bench_vector_index.py [--rows 100000] [--dim 1024] [--k 20] [--queries 50]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+# The clients are created at import time but never called here
+os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+
+import numpy as np
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=1024)
+    parser.add_argument("--k", type=int, default=20)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--cvs-per-candidate", type=int, default=2)
+    args = parser.parse_args()
+
+    from candidate_index import VectorIndex
+
+    rng = np.random.default_rng(0)
+    index = VectorIndex()
+    t0 = time.perf_counter()
+    for start in range(0, args.rows, 10000):
+        block = rng.standard_normal((min(10000, args.rows - start), args.dim), dtype=np.float32)
+        for offset, vector in enumerate(block):
+            row = start + offset
+            index.add(f"cv-{row}", f"user-{row // args.cvs_per_candidate}", vector)
+    print(f"Built {len(index)} x {args.dim} index in {time.perf_counter() - t0:.1f}s "
+          f"({len(index) * args.dim * 4 / 2 ** 20:.0f} MB)")
+
+    queries = rng.standard_normal((args.queries, args.dim), dtype=np.float32)
+    index.search(queries[0], args.k)  # warm up
+    timings = []
+    for query in queries:
+        t0 = time.perf_counter()
+        results = index.search(query, args.k)
+        timings.append((time.perf_counter() - t0) * 1000)
+    timings.sort()
+    print(f"{args.queries} queries, top {args.k} ({len(results)} returned): "
+          f"median {timings[len(timings) // 2]:.1f}ms, p95 {timings[int(len(timings) * 0.95)]:.1f}ms, "
+          f"max {timings[-1]:.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
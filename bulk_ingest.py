@@ -0,0 +1,303 @@
+"""Bulk resume ingestion.
+
+Parses many PDFs on a small concurrency-limited pool and writes every cvs
+row with one bulk insert. Progress is checkpointed per file (keyed by PDF
+hash), so an interrupted run can be restarted without redoing finished
+files or inserting duplicates. The checkpoint only records which files are
+done; each file's parsed row is stored separately (see save_result), so
+saving the checkpoint stays small however many files are in the run.
+
+Command line:
+
+    python bulk_ingest.py PATH [--email EMAIL --password PASSWORD]
+
+PATH is a directory of PDFs or a .zip file. Credentials default to the
+BULK_EMAIL / BULK_PASSWORD environment variables.
+"""
+import os
+import sys
+import json
+import time
+import zipfile
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import cache_service
+import candidate_index
+import cv_texts
+import parse_service
+import resume_service
+import skill_taxonomy
+import upload_service
+
+BULK_CONCURRENCY = int(os.environ.get("BULK_CONCURRENCY", "4"))
+# Caps how fast new files start; individual Mistral calls are also rate limited by mistral_client
+BULK_FILES_PER_MINUTE = int(os.environ.get("BULK_FILES_PER_MINUTE", "30"))
+BULK_MAX_FILES = int(os.environ.get("BULK_MAX_FILES", "500"))
+
+
+class Throttle:
+    """Spaces out calls to at most `per_minute` per minute across threads."""
+
+    def __init__(self, per_minute):
+        self.interval = 60.0 / per_minute if per_minute > 0 else 0
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            now = time.monotonic()
+            start = max(now, self._next)
+            self._next = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+
+def directory_sources(path):
+    """(filename, loader) pairs for every PDF in a directory, sorted by name."""
+    names = sorted(n for n in os.listdir(path) if n.lower().endswith(".pdf"))
+    return [(name, _file_loader(os.path.join(path, name))) for name in names]
+
+
+def _file_loader(path):
+    def load():
+        with open(path, "rb") as f:
+            return f.read()
+    return load
+
+
+def zip_sources(archive):
+    """(filename, loader) pairs for every PDF in an open ZipFile."""
+    sources = []
+    for info in archive.infolist():
+        if info.is_dir() or not info.filename.lower().endswith(".pdf"):
+            continue
+        if os.path.basename(info.filename).startswith("._"):
+            continue  # macOS resource forks
+        if info.file_size > upload_service.MAX_UPLOAD_BYTES:
+            raise upload_service.UploadTooLargeError(f"{info.filename} is larger than the upload limit")
+        sources.append((os.path.basename(info.filename), _zip_loader(archive, info)))
+    return sources
+
+
+def _zip_loader(archive, info):
+    return lambda: archive.read(info)
+
+
+def new_checkpoint():
+    """{"done": {pdf hash: filename}, "failed": {filename: error}, "inserted": [pdf hash]}"""
+    return {"done": {}, "failed": {}, "inserted": []}
+
+
+def ingest(sources, user_client, user_id, checkpoint=None, save_checkpoint=None,
+           report=None, concurrency=BULK_CONCURRENCY, files_per_minute=BULK_FILES_PER_MINUTE,
+           save_result=None, load_result=None):
+    """Parse every source and bulk-insert the results into cvs.
+
+    `sources` is a list of (filename, loader) pairs where loader() returns
+    the PDF bytes. `checkpoint` (see new_checkpoint) is updated in place and
+    passed to `save_checkpoint` after every file. Each parsed cvs row is
+    passed to `save_result(pdf_hash, row)` before the file is marked done,
+    and read back with `load_result(pdf_hash)` for the insert; both default
+    to an in-memory dict. Returns a summary dict.
+    """
+    if len(sources) > BULK_MAX_FILES:
+        raise ValueError(f"At most {BULK_MAX_FILES} files can be ingested at once")
+
+    checkpoint = checkpoint or new_checkpoint()
+    save_checkpoint = save_checkpoint or (lambda cp: None)
+    if save_result is None or load_result is None:
+        results = {}
+        save_result, load_result = results.__setitem__, results.get
+    throttle = Throttle(files_per_minute)
+    lock = threading.Lock()
+    counts = {"processed": 0, "skipped": 0, "failed": 0}
+    # PDF hash -> OCR text of files parsed in this run, saved to cv_texts after the insert
+    raw_texts = {}
+    total = len(sources)
+    t0 = time.perf_counter()
+
+    def progress():
+        if report:
+            done = counts["processed"] + counts["skipped"] + counts["failed"]
+            report("parsing", done=done, total=total, **counts)
+
+    def process(name, load):
+        try:
+            pdf_bytes = load()
+            keys = parse_service.cache_keys(pdf_bytes)
+            with lock:
+                if keys["pdf"] in checkpoint["done"]:
+                    counts["skipped"] += 1
+                    progress()
+                    return
+
+            throttle.wait()
+            raw_text, resume_data, score_data = parse_service.analyze_pdf(pdf_bytes, keys)
+            structure_version, score_version = resume_service.stored_versions(parse_service.PARSE_MODE)
+            # storage3 only uploads bytes, files or paths, not memoryviews of spooled uploads
+            file_path = parse_service.upload_pdf(user_client, user_id, name, bytes(pdf_bytes))
+            if not file_path:
+                # Don't insert a CV that has no stored PDF; the file is retried on the next run
+                raise RuntimeError("Storage upload failed")
+
+            save_result(keys["pdf"], {
+                "filename": name,
+                "file_path": file_path,
+                "resume_data": resume_data,
+                "score_data": score_data,
+                "skill_ids": skill_taxonomy.resume_skill_ids(resume_data),
+                "pdf_hash": keys["pdf"],
+                "structure_version": structure_version,
+                "score_version": score_version
+            })
+            with lock:
+                checkpoint["done"][keys["pdf"]] = name
+                raw_texts[keys["pdf"]] = raw_text
+                checkpoint["failed"].pop(name, None)
+                counts["processed"] += 1
+                save_checkpoint(checkpoint)
+                progress()
+        except Exception as e:
+            print(f"Bulk ingest error for {name}: {e}")
+            with lock:
+                checkpoint["failed"][name] = str(e)
+                counts["failed"] += 1
+                save_checkpoint(checkpoint)
+                progress()
+
+    progress()
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="bulk") as pool:
+        for name, load in sources:
+            pool.submit(process, name, load)
+
+    # One bulk insert for everything not written by an earlier run
+    if report:
+        report("saving")
+    inserted = set(checkpoint["inserted"])
+    pending = []
+    rows = []
+    for pdf_hash, name in list(checkpoint["done"].items()):
+        if pdf_hash in inserted:
+            continue
+        # Checkpoints written before results were stored separately hold the row itself
+        row = name if isinstance(name, dict) else load_result(pdf_hash)
+        if row is None:
+            # The stored result expired; parse the file again on the next run
+            del checkpoint["done"][pdf_hash]
+            checkpoint["failed"][name] = "Parsed result expired before it was saved; submit the file again"
+            continue
+        pending.append(pdf_hash)
+        rows.append(dict(row, user_id=user_id))
+    cv_ids = []
+    if pending:
+        result = user_client.table('cvs').insert(rows).execute()
+        cv_ids = [row['id'] for row in (result.data or [])]
+        candidate_index.index_cvs([(row['id'], user_id, row['resume_data']) for row in (result.data or [])])
+        # OCR text for cv_texts is kept from this run; files parsed by an earlier,
+        # interrupted run fall back to the OCR cache
+        try:
+            cv_texts.save_many(user_client, [
+                (row['id'], user_id, raw_texts.get(row['pdf_hash']) or cache_service.get(
+                    "ocr", parse_service.keys_for_hash(row['pdf_hash'])["ocr"]))
+                for row in (result.data or []) if row.get('pdf_hash')
+            ])
+        except Exception as e:
+            print(f"Bulk ingest error saving OCR text: {e}")
+        checkpoint["inserted"].extend(pending)
+        save_checkpoint(checkpoint)
+
+    elapsed = time.perf_counter() - t0
+    return {
+        "total": total,
+        "processed": counts["processed"],
+        "skipped": counts["skipped"],
+        "failed": checkpoint["failed"],
+        "inserted": len(pending),
+        "cv_ids": cv_ids,
+        "elapsed_seconds": round(elapsed, 1),
+        "cvs_per_minute": round(counts["processed"] / elapsed * 60, 1) if elapsed > 0 else 0
+    }
+
+
+def _write_json(path, value):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _file_checkpoint(path):
+    """Load a JSON checkpoint file and return (checkpoint, save function)."""
+    checkpoint = new_checkpoint()
+    if os.path.exists(path):
+        with open(path, "r", encoding="utf-8") as f:
+            checkpoint.update(json.load(f))
+    return checkpoint, lambda cp: _write_json(path, cp)
+
+
+def _file_results(directory):
+    """(save_result, load_result) keeping one JSON file per PDF hash in a directory."""
+    os.makedirs(directory, exist_ok=True)
+
+    def save(pdf_hash, row):
+        _write_json(os.path.join(directory, f"{pdf_hash}.json"), row)
+
+    def load(pdf_hash):
+        try:
+            with open(os.path.join(directory, f"{pdf_hash}.json"), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    return save, load
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Parse a directory or zip of PDF resumes into the cvs table.")
+    parser.add_argument("path", help="Directory of PDFs or a .zip archive")
+    parser.add_argument("--email", default=os.environ.get("BULK_EMAIL"))
+    parser.add_argument("--password", default=os.environ.get("BULK_PASSWORD"))
+    parser.add_argument("--checkpoint", help="Checkpoint file (default: <path>.ingest.json)")
+    parser.add_argument("--concurrency", type=int, default=BULK_CONCURRENCY)
+    parser.add_argument("--files-per-minute", type=int, default=BULK_FILES_PER_MINUTE)
+    args = parser.parse_args(argv)
+
+    if not args.email or not args.password:
+        parser.error("--email and --password (or BULK_EMAIL / BULK_PASSWORD) are required")
+
+    import auth_service
+    session = auth_service.sign_in(args.email, args.password)
+    user_client = auth_service.get_client(session.access_token)
+
+    checkpoint_path = args.checkpoint or f"{os.path.abspath(args.path).rstrip(os.sep)}.ingest.json"
+    checkpoint, save = _file_checkpoint(checkpoint_path)
+    save_result, load_result = _file_results(f"{checkpoint_path}.results")
+
+    def report(stage, **progress):
+        if stage == "parsing":
+            print(f"\r{progress['done']}/{progress['total']} files "
+                  f"({progress['failed']} failed, {progress['skipped']} already done)", end="", flush=True)
+        else:
+            print(f"\n{stage}...")
+
+    archive = zipfile.ZipFile(args.path) if zipfile.is_zipfile(args.path) else None
+    try:
+        sources = zip_sources(archive) if archive else directory_sources(args.path)
+        summary = ingest(sources, user_client, session.user.id, checkpoint, save, report,
+                         concurrency=args.concurrency, files_per_minute=args.files_per_minute,
+                         save_result=save_result, load_result=load_result)
+    finally:
+        if archive:
+            archive.close()
+
+    print(f"Inserted {summary['inserted']} CVs in {summary['elapsed_seconds']}s "
+          f"({summary['cvs_per_minute']} CVs/minute), {len(summary['failed'])} failed")
+    for name, error in summary["failed"].items():
+        print(f"  {name}: {error}")
+    print(f"Checkpoint: {checkpoint_path}")
+    return 1 if summary["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
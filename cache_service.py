@@ -0,0 +1,133 @@
+import os
+import json
+import hashlib
+import tempfile
+import threading
+
+# Content-addressed on-disk cache for OCR and LLM results
+CACHE_DIR = os.environ.get("RESUME_CACHE_DIR", os.path.join(tempfile.gettempdir(), "resume_cache"))
+CACHE_MAX_BYTES = int(os.environ.get("RESUME_CACHE_MAX_BYTES", str(512 * 1024 * 1024)))
+
+_lock = threading.Lock()
+_size = None  # Bytes on disk, computed lazily on first write
+_counters = {}
+
+
+def content_hash(data):
+    """SHA-256 hex digest of raw bytes (e.g. an uploaded PDF)."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def make_key(*parts):
+    """Combine content hashes and prompt/model versions into one cache key."""
+    return hashlib.sha256(":".join(str(p) for p in parts).encode("utf-8")).hexdigest()
+
+
+def _path(namespace, key):
+    return os.path.join(CACHE_DIR, namespace, key[:2], f"{key}.json")
+
+
+def _count(namespace, outcome):
+    with _lock:
+        entry = _counters.setdefault(namespace, {"hits": 0, "misses": 0})
+        entry[outcome] += 1
+
+
+def get(namespace, key):
+    """Return the cached value, or None on a miss."""
+    path = _path(namespace, key)
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            value = json.load(f)
+    except (OSError, ValueError):
+        _count(namespace, "misses")
+        return None
+
+    # Touch the entry so eviction treats it as recently used
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    _count(namespace, "hits")
+    return value
+
+
+def put(namespace, key, value):
+    """Store a JSON-serializable value, evicting least recently used entries if needed."""
+    global _size
+    path = _path(namespace, key)
+    payload = json.dumps(value, ensure_ascii=False).encode("utf-8")
+    # An overwritten entry's old size no longer counts towards the total
+    try:
+        replaced = os.path.getsize(path)
+    except OSError:
+        replaced = 0
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Cache write error: {e}")
+        return
+
+    with _lock:
+        if _size is None:
+            _size = _disk_usage()
+        else:
+            _size += len(payload) - replaced
+        if _size > CACHE_MAX_BYTES:
+            _size = _evict(CACHE_MAX_BYTES * 0.9)
+
+
+def cached(namespace, key, compute):
+    """Return the cached value for key, calling compute() and storing it on a miss."""
+    value = get(namespace, key)
+    if value is None:
+        value = compute()
+        put(namespace, key, value)
+    return value
+
+
+def _entries():
+    for root, _, files in os.walk(CACHE_DIR):
+        for name in files:
+            if name.endswith(".json"):
+                path = os.path.join(root, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_size, st.st_mtime
+
+
+def _disk_usage():
+    return sum(size for _, size, _ in _entries())
+
+
+def _evict(target_bytes):
+    """Delete least recently used entries until the cache fits in target_bytes."""
+    entries = sorted(_entries(), key=lambda e: e[2])
+    total = sum(size for _, size, _ in entries)
+    for path, size, _ in entries:
+        if total <= target_bytes:
+            break
+        try:
+            os.remove(path)
+            total -= size
+        except OSError:
+            pass
+    return total
+
+
+def stats():
+    """Hit/miss counters per namespace plus current disk usage."""
+    with _lock:
+        counters = {ns: dict(c) for ns, c in _counters.items()}
+        size = _size
+    return {
+        "namespaces": counters,
+        "bytes": size if size is not None else _disk_usage(),
+        "max_bytes": CACHE_MAX_BYTES,
+    }
@@ -0,0 +1,405 @@
+"""Semantic candidate matching.
+
+Every CV written by the parse pipeline or bulk ingest is embedded in the
+background (summary, experience and skills) with the Mistral embeddings
+API. The vectors are stored in the cv_embeddings table and held in memory as
+one L2-normalized float32 matrix, so matching a job description is a single
+matrix-vector product plus a partial sort.
+
+Memory is rows x dimension x 4 bytes: 100k CVs with mistral-embed's 1024
+dimensions is about 400 MB per worker. The matrix is loaded on a background
+thread at startup, picks up rows written by other workers every
+CANDIDATE_INDEX_REFRESH_SECONDS and drops deleted CVs every
+CANDIDATE_INDEX_PRUNE_SECONDS.
+
+cv_embeddings spans every user's CVs, so it is read and written with the
+service role key (SUPABASE_SERVICE_ROLE_KEY). Without it matching is
+disabled.
+
+Command line, to embed CVs written before this existed (or after a model
+change):
+
+    python candidate_index.py --backfill
+"""
+import os
+import sys
+import json
+import time
+import base64
+import argparse
+import threading
+from datetime import datetime, timezone
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from supabase import create_client
+import cache_service
+import mistral_client
+import skill_taxonomy
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+EMBEDDING_MODEL = os.environ.get("EMBEDDING_MODEL", "mistral-embed")
+# Characters of resume or job description text sent per embedding
+EMBEDDING_MAX_CHARS = int(os.environ.get("EMBEDDING_MAX_CHARS", "8000"))
+EMBEDDING_BATCH_SIZE = int(os.environ.get("EMBEDDING_BATCH_SIZE", "32"))
+CANDIDATE_INDEX_REFRESH_SECONDS = int(os.environ.get("CANDIDATE_INDEX_REFRESH_SECONDS", "60"))
+CANDIDATE_INDEX_PRUNE_SECONDS = int(os.environ.get("CANDIDATE_INDEX_PRUNE_SECONDS", "900"))
+MATCH_MAX_RESULTS = int(os.environ.get("MATCH_MAX_RESULTS", "100"))
+_PAGE_SIZE = 1000
+
+_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY) if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY else None
+_embed_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+
+_counters = {"embedded": 0, "searches": 0, "search_seconds": 0.0}
+_counters_lock = threading.Lock()
+
+
+def enabled():
+    return _client is not None
+
+
+def _count(name, value=1):
+    with _counters_lock:
+        _counters[name] += value
+
+
+class VectorIndex:
+    """Cosine-similarity index over L2-normalized float32 rows.
+
+    Each row is a CV (`key`) belonging to a candidate (`owner`). The matrix
+    grows by doubling, and removal swaps the last row into the gap, so rows
+    stay contiguous for the matrix-vector product.
+    """
+
+    def __init__(self):
+        self._vectors = None
+        self._size = 0
+        self._keys = []
+        self._owners = []
+        self._rows = {}  # key -> row
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self._size
+
+    def add(self, key, owner, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        if not norm:
+            return
+        vector = vector / norm
+        with self._lock:
+            if self._vectors is None:
+                self._vectors = np.empty((64, vector.shape[0]), dtype=np.float32)
+            if vector.shape[0] != self._vectors.shape[1]:
+                raise ValueError(f"Vector has {vector.shape[0]} dimensions, index has {self._vectors.shape[1]}")
+            row = self._rows.get(key)
+            if row is None:
+                if self._size == self._vectors.shape[0]:
+                    grown = np.empty((self._size * 2, self._vectors.shape[1]), dtype=np.float32)
+                    grown[:self._size] = self._vectors[:self._size]
+                    self._vectors = grown
+                row = self._size
+                self._size += 1
+                self._keys.append(key)
+                self._owners.append(owner)
+                self._rows[key] = row
+            self._vectors[row] = vector
+            self._owners[row] = owner
+
+    def remove(self, key):
+        with self._lock:
+            row = self._rows.pop(key, None)
+            if row is None:
+                return
+            last = self._size - 1
+            if row != last:
+                self._vectors[row] = self._vectors[last]
+                self._keys[row] = self._keys[last]
+                self._owners[row] = self._owners[last]
+                self._rows[self._keys[row]] = row
+            self._keys.pop()
+            self._owners.pop()
+            self._size = last
+
+    def keys(self):
+        with self._lock:
+            return list(self._keys)
+
+    def search(self, query, k):
+        """Top k owners by their best-matching row: [(owner, key, similarity)]."""
+        query = np.asarray(query, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if not norm or k <= 0:
+            return []
+        query = query / norm
+        with self._lock:
+            n = self._size
+            if n == 0:
+                return []
+            scores = self._vectors[:n] @ query
+            # Candidates can have several CVs, so look a little past k rows
+            # and widen only if duplicates leave fewer than k owners
+            want = min(n, k * 4)
+            while True:
+                if want < n:
+                    top = np.argpartition(scores, n - want)[n - want:]
+                else:
+                    top = np.arange(n)
+                top = top[np.argsort(scores[top])[::-1]]
+                results, seen = [], set()
+                for row in top:
+                    owner = self._owners[row]
+                    if owner in seen:
+                        continue
+                    seen.add(owner)
+                    results.append((owner, self._keys[row], float(scores[row])))
+                    if len(results) == k:
+                        return results
+                if want == n:
+                    return results
+                want = min(n, want * 4)
+
+
+_index = VectorIndex()
+_sync_lock = threading.Lock()
+_loaded = False
+_synced_at = None  # newest cv_embeddings.updated_at seen
+_next_refresh = 0.0
+_next_prune = 0.0
+_started = False
+
+
+def encode_vector(vector):
+    """float32 vector -> base64 text, as stored in cv_embeddings.embedding."""
+    return base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii")
+
+
+def decode_vector(text):
+    return np.frombuffer(base64.b64decode(text), dtype="<f4")
+
+
+def resume_text(resume_data):
+    """The parts of a resume that describe what the candidate does."""
+    if not isinstance(resume_data, dict):
+        return ""
+    parts = []
+    if isinstance(resume_data.get("summary"), str):
+        parts.append(resume_data["summary"])
+    for job in resume_data.get("experience") or []:
+        if not isinstance(job, dict):
+            continue
+        parts.append(" at ".join(str(job[f]) for f in ("title", "company") if job.get(f)))
+        responsibilities = job.get("responsibilities")
+        if isinstance(responsibilities, list):
+            parts.extend(str(r) for r in responsibilities)
+        elif responsibilities:
+            parts.append(str(responsibilities))
+    skills = list(skill_taxonomy.skill_names(resume_data.get("skills")))
+    if skills:
+        parts.append("Skills: " + ", ".join(skills))
+    return "\n".join(p for p in parts if p).strip()[:EMBEDDING_MAX_CHARS]
+
+
+def embed_texts(texts):
+    """Embedding vectors (float32 arrays) for texts, in order."""
+    vectors = []
+    for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+        response = mistral_client.embed(EMBEDDING_MODEL, inputs=texts[start:start + EMBEDDING_BATCH_SIZE])
+        vectors.extend(np.asarray(item.embedding, dtype=np.float32) for item in response.data)
+    return vectors
+
+
+def _store(entries, vectors):
+    now = datetime.now(timezone.utc).isoformat()
+    rows = [{
+        "cv_id": cv_id,
+        "user_id": user_id,
+        "model": EMBEDDING_MODEL,
+        "embedding": encode_vector(vector),
+        "updated_at": now
+    } for (cv_id, user_id, _), vector in zip(entries, vectors)]
+    _client.table('cv_embeddings').upsert(rows, on_conflict='cv_id').execute()
+
+
+def index_now(entries):
+    """Embed, store and index [(cv_id, user_id, resume_data)]. Returns the number indexed."""
+    entries = [(cv_id, user_id, resume_text(resume_data)) for cv_id, user_id, resume_data in entries if cv_id]
+    entries = [entry for entry in entries if entry[2]]
+    if not entries:
+        return 0
+    vectors = embed_texts([text for _, _, text in entries])
+    _store(entries, vectors)
+    for (cv_id, user_id, _), vector in zip(entries, vectors):
+        _index.add(cv_id, user_id, vector)
+    _count("embedded", len(entries))
+    return len(entries)
+
+
+def index_cvs(entries):
+    """Index [(cv_id, user_id, resume_data)] in the background."""
+    if not enabled() or not entries:
+        return
+
+    def run():
+        try:
+            index_now(entries)
+        except Exception as e:
+            print(f"Candidate index error: {e}")
+
+    _embed_pool.submit(run)
+
+
+def remove(cv_id):
+    """Drop a deleted CV from this worker's index (its row cascades in the database)."""
+    _index.remove(cv_id)
+
+
+def _load_since(since):
+    """Add every stored vector updated at or after `since` (all of them if None).
+
+    Pages by (updated_at, cv_id), since one index_now() batch shares a single
+    updated_at and may be larger than a page.
+    """
+    global _synced_at
+    last = None
+    while True:
+        query = _client.table('cv_embeddings').select('cv_id, user_id, embedding, updated_at').eq(
+            'model', EMBEDDING_MODEL)
+        if last:
+            # Quoted, since timestamps contain PostgREST filter syntax characters
+            updated_at, cv_id = json.dumps(last[0]), json.dumps(last[1])
+            query = query.or_(f'updated_at.gt.{updated_at},and(updated_at.eq.{updated_at},cv_id.gt.{cv_id})')
+        elif since:
+            query = query.gte('updated_at', since)
+        rows = query.order('updated_at').order('cv_id').limit(_PAGE_SIZE).execute().data or []
+        for row in rows:
+            _index.add(row['cv_id'], row['user_id'], decode_vector(row['embedding']))
+        if rows:
+            _synced_at = max(_synced_at or rows[-1]['updated_at'], rows[-1]['updated_at'])
+        if len(rows) < _PAGE_SIZE:
+            return
+        last = (rows[-1]['updated_at'], rows[-1]['cv_id'])
+
+
+def _prune():
+    """Drop CVs whose rows were deleted (by any worker)."""
+    stored = set()
+    last = None
+    while True:
+        query = _client.table('cv_embeddings').select('cv_id').eq('model', EMBEDDING_MODEL)
+        if last:
+            query = query.gt('cv_id', last)
+        rows = query.order('cv_id').limit(_PAGE_SIZE).execute().data or []
+        stored.update(row['cv_id'] for row in rows)
+        if len(rows) < _PAGE_SIZE:
+            break
+        last = rows[-1]['cv_id']
+    for cv_id in _index.keys():
+        if cv_id not in stored:
+            _index.remove(cv_id)
+
+
+def sync():
+    """Bring this worker's index up to date with cv_embeddings, if due."""
+    global _loaded, _next_refresh, _next_prune
+    if not enabled():
+        return
+    with _sync_lock:
+        now = time.time()
+        try:
+            if not _loaded or now >= _next_refresh:
+                _load_since(_synced_at)
+                _loaded = True
+                _next_refresh = now + CANDIDATE_INDEX_REFRESH_SECONDS
+            if now >= _next_prune:
+                if _next_prune:
+                    _prune()
+                _next_prune = now + CANDIDATE_INDEX_PRUNE_SECONDS
+        except Exception as e:
+            print(f"Candidate index sync error: {e}")
+
+
+def start():
+    """Load the index on a daemon thread so the first match doesn't wait for it."""
+    global _started
+    if not enabled() or _started:
+        return
+    _started = True
+    threading.Thread(target=sync, name="candidate-index-load", daemon=True).start()
+
+
+def embed_query(text):
+    """Embedding of a job description, cached by content."""
+    text = text.strip()[:EMBEDDING_MAX_CHARS]
+    key = cache_service.make_key(cache_service.content_hash(text.encode("utf-8")), EMBEDDING_MODEL)
+    return cache_service.cached("embedding", key, lambda: embed_texts([text])[0].tolist())
+
+
+def match(job_description, k):
+    """Top k candidates for a job description: [{"user_id", "cv_id", "similarity"}]."""
+    sync()
+    query = embed_query(job_description)
+    start = time.perf_counter()
+    results = _index.search(query, min(k, MATCH_MAX_RESULTS))
+    _count("searches")
+    _count("search_seconds", time.perf_counter() - start)
+    return [{"user_id": owner, "cv_id": cv_id, "similarity": round(score, 4)} for owner, cv_id, score in results]
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    searches = counters.pop("search_seconds")
+    counters["mean_search_ms"] = round(searches / counters["searches"] * 1000, 2) if counters["searches"] else 0
+    counters["indexed"] = len(_index)
+    counters["enabled"] = enabled()
+    return counters
+
+
+def backfill():
+    """Embed every CV that has no vector for EMBEDDING_MODEL. Returns the number embedded."""
+    done = set()
+    last = None
+    while True:
+        query = _client.table('cv_embeddings').select('cv_id').eq('model', EMBEDDING_MODEL)
+        if last:
+            query = query.gt('cv_id', last)
+        rows = query.order('cv_id').limit(_PAGE_SIZE).execute().data or []
+        done.update(row['cv_id'] for row in rows)
+        if len(rows) < _PAGE_SIZE:
+            break
+        last = rows[-1]['cv_id']
+
+    embedded = 0
+    last = None
+    while True:
+        query = _client.table('cvs').select('id, user_id, resume_data')
+        if last:
+            query = query.gt('id', last)
+        rows = query.order('id').limit(EMBEDDING_BATCH_SIZE).execute().data or []
+        pending = [(row['id'], row['user_id'], row['resume_data']) for row in rows if row['id'] not in done]
+        if pending:
+            embedded += index_now(pending)
+            print(f"Embedded {embedded} CVs")
+        if len(rows) < EMBEDDING_BATCH_SIZE:
+            return embedded
+        last = rows[-1]['id']
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Embed CVs for semantic candidate matching.")
+    parser.add_argument("--backfill", action="store_true", help="Embed every CV that has no vector yet")
+    args = parser.parse_args(argv)
+    if not enabled():
+        parser.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
+    if args.backfill:
+        print(f"Embedded {backfill()} CVs")
+    else:
+        parser.print_help()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
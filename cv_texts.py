@@ -0,0 +1,53 @@
+"""Raw OCR text of every CV, kept so nothing has to OCR a PDF twice.
+
+The markdown from ocr_service is gzip-compressed and stored base64-encoded
+in the cv_texts table, one row per CV. It is only fetched and decompressed
+when something asks for it (re-structuring, re-scoring), never with the CV
+itself.
+"""
+import os
+import gzip
+import base64
+import ocr_service
+
+CV_TEXT_COMPRESSLEVEL = int(os.environ.get("CV_TEXT_COMPRESSLEVEL", "6"))
+
+
+def compress(text):
+    """str -> base64 of its gzip-compressed UTF-8 bytes."""
+    data = gzip.compress(text.encode("utf-8"), compresslevel=CV_TEXT_COMPRESSLEVEL, mtime=0)
+    return base64.b64encode(data).decode("ascii")
+
+
+def decompress(content):
+    return gzip.decompress(base64.b64decode(content)).decode("utf-8")
+
+
+def save_many(client, entries):
+    """Store [(cv_id, user_id, raw_text)] in one upsert, skipping entries without text."""
+    rows = [{
+        "cv_id": cv_id,
+        "user_id": user_id,
+        "ocr_version": ocr_service.OCR_VERSION,
+        "encoding": "gzip",
+        "content": compress(raw_text),
+        "chars": len(raw_text)
+    } for cv_id, user_id, raw_text in entries if cv_id and raw_text]
+    if rows:
+        client.table('cv_texts').upsert(rows, on_conflict='cv_id').execute()
+    return len(rows)
+
+
+def save(client, cv_id, user_id, raw_text):
+    return save_many(client, [(cv_id, user_id, raw_text)])
+
+
+def load(client, cv_id):
+    """The CV's OCR text, or None if it was never stored."""
+    result = client.table('cv_texts').select('encoding, content').eq('cv_id', cv_id).execute()
+    if not result.data:
+        return None
+    row = result.data[0]
+    if row['encoding'] != "gzip":
+        raise ValueError(f"Unknown cv_texts encoding: {row['encoding']}")
+    return decompress(row['content'])
@@ -0,0 +1,173 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+import session_store
+
+# Bounded local worker pool for long-running jobs (resume parsing)
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.environ.get("JOB_QUEUE_SIZE", "16"))
+JOB_TTL_SECONDS = int(os.environ.get("JOB_TTL_SECONDS", "3600"))
+# Streamed progress is mirrored to the shared store at most this often (seconds);
+# status and stage changes are always mirrored right away
+JOB_PUBLISH_INTERVAL = float(os.environ.get("JOB_PUBLISH_INTERVAL", "0.25"))
+
+_executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+_slots = threading.BoundedSemaphore(JOB_WORKERS + JOB_QUEUE_SIZE)
+_jobs = {}
+# Snapshots for other worker processes, apart from user sessions
+_store = session_store.Namespace("jobs")
+# job id -> (monotonic time, status, stage) of the last mirrored snapshot
+_published = {}
+_changed = threading.Condition()
+
+
+class QueueFullError(Exception):
+    """Raised when every worker is busy and the job queue is full."""
+
+
+def submit(owner_id, fn, *args, **kwargs):
+    """Queue fn(report, *args, **kwargs) and return the new job id.
+
+    `report(stage, **extra)` lets the job publish progress while it runs.
+    Raises QueueFullError instead of queueing without bound.
+    """
+    if not _slots.acquire(blocking=False):
+        raise QueueFullError("Too many jobs in progress. Please try again shortly.")
+
+    _expire_jobs()
+    job_id = uuid.uuid4().hex
+    now = time.time()
+    with _changed:
+        job = _jobs[job_id] = {
+            "id": job_id,
+            "owner_id": owner_id,
+            "status": "queued",
+            "stage": None,
+            "progress": {},
+            "result": None,
+            "error": None,
+            "version": 0,
+            "created_at": now,
+            "updated_at": now,
+        }
+    _publish(job)
+
+    try:
+        _executor.submit(_run, job_id, fn, args, kwargs)
+    except Exception:
+        _slots.release()
+        with _changed:
+            _jobs.pop(job_id, None)
+        raise
+    return job_id
+
+
+def _run(job_id, fn, args, kwargs):
+    def report(stage, **extra):
+        _update(job_id, stage=stage, progress=extra)
+
+    _update(job_id, status="running")
+    try:
+        result = fn(report, *args, **kwargs)
+        _update(job_id, status="done", stage="done", result=result)
+    except Exception as e:
+        print(f"Job {job_id} failed: {e}")
+        _update(job_id, status="failed", error=str(e))
+    finally:
+        _slots.release()
+
+
+def _update(job_id, progress=None, **fields):
+    with _changed:
+        job = _jobs.get(job_id)
+        if not job:
+            return
+        job.update(fields)
+        if progress:
+            job["progress"].update(progress)
+        job["version"] += 1
+        job["updated_at"] = time.time()
+        snapshot = dict(job, progress=dict(job["progress"]))
+        _changed.notify_all()
+        # Local waiters see every update; other workers poll, so partial results
+        # only need to reach the store every JOB_PUBLISH_INTERVAL
+        now = time.monotonic()
+        last = _published.get(job_id)
+        if last and last[1:] == (job["status"], job["stage"]) and now - last[0] < JOB_PUBLISH_INTERVAL:
+            return
+        if job["status"] in ("done", "failed"):
+            _published.pop(job_id, None)
+        else:
+            _published[job_id] = (now, job["status"], job["stage"])
+    _publish(snapshot)
+
+
+def _publish(job):
+    """Mirror the job into the shared session store so any worker can report on it."""
+    try:
+        _store.put(job['id'], job)
+    except Exception as e:
+        print(f"Job store error: {e}")
+
+
+def _expire_jobs():
+    """Drop finished jobs older than JOB_TTL_SECONDS."""
+    cutoff = time.time() - JOB_TTL_SECONDS
+    with _changed:
+        for job_id in [j["id"] for j in _jobs.values()
+                       if j["status"] in ("done", "failed") and j["updated_at"] < cutoff]:
+            del _jobs[job_id]
+
+
+def get_job(job_id, owner_id=None):
+    """Return a snapshot of a job, or None if unknown or owned by someone else."""
+    with _changed:
+        job = _jobs.get(job_id)
+        if job:
+            job = dict(job, progress=dict(job["progress"]))
+    if not job:
+        # Submitted on another worker process
+        job = _store.get(job_id)
+    if not job or (owner_id is not None and job["owner_id"] != owner_id):
+        return None
+    return job
+
+
+def wait_for_change(job_id, version, timeout=15):
+    """Block until the job moves past `version` (or timeout) and return a snapshot."""
+    deadline = time.time() + timeout
+    with _changed:
+        local = job_id in _jobs
+    if not local:
+        # Another worker owns the job; poll the shared store instead
+        while True:
+            job = get_job(job_id)
+            if not job or job["version"] > version or time.time() >= deadline:
+                return job
+            time.sleep(1)
+
+    with _changed:
+        while True:
+            job = _jobs.get(job_id)
+            if not job or job["version"] > version:
+                break
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            _changed.wait(remaining)
+    return get_job(job_id)
+
+
+def stats():
+    """Current queue depth and worker capacity."""
+    with _changed:
+        queued = sum(1 for j in _jobs.values() if j["status"] == "queued")
+        running = sum(1 for j in _jobs.values() if j["status"] == "running")
+    return {
+        "workers": JOB_WORKERS,
+        "queue_size": JOB_QUEUE_SIZE,
+        "queued": queued,
+        "running": running,
+    }
@@ -0,0 +1,126 @@
+import json
+
+
+class PartialJSONObject:
+    """Incremental parser for a streamed top-level JSON object.
+
+    Feed it text chunks as they arrive. `partial` holds every top-level field
+    whose value has been fully received, and for top-level arrays that are
+    still streaming, the items completed so far. Nothing is re-parsed: each
+    chunk is scanned once, and only finished values go through json.loads.
+    """
+
+    def __init__(self):
+        self.partial = {}
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = None
+        self._key_start = None
+        self._key = None
+        self._value_start = None
+        self._array_key = None
+        self._item_start = None
+
+    @property
+    def text(self):
+        return self._text
+
+    def feed(self, chunk):
+        """Consume the next chunk of text. Returns True if `partial` changed."""
+        self._text += chunk
+        changed = False
+        text = self._text
+        for i in range(self._pos, len(text)):
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    changed |= self._string_closed(i)
+                continue
+
+            if c == '"':
+                self._in_string = True
+                self._string_start = i
+                if self._depth == 1 and self._key is None:
+                    self._key_start = i
+                else:
+                    self._value_started(i)
+            elif c in "{[":
+                self._value_started(i)
+                if self._depth == 1 and self._key is not None and c == "[":
+                    self._array_key = self._key
+                    self.partial[self._key] = []
+                    changed = True
+                self._depth += 1
+            elif c in "}]":
+                # A number/true/false/null runs until the closing bracket
+                if self._depth == 2 and self._item_start is not None:
+                    changed |= self._finish_item(text[self._item_start:i])
+                if self._depth == 1 and self._value_start is not None:
+                    changed |= self._finish_value(text[self._value_start:i])
+                self._depth -= 1
+                if self._depth == 2 and self._item_start is not None:
+                    changed |= self._finish_item(text[self._item_start:i + 1])
+                elif self._depth == 1 and self._value_start is not None:
+                    changed |= self._finish_value(text[self._value_start:i + 1])
+            elif c == ",":
+                if self._depth == 2 and self._item_start is not None:
+                    changed |= self._finish_item(text[self._item_start:i])
+                elif self._depth == 1 and self._value_start is not None:
+                    changed |= self._finish_value(text[self._value_start:i])
+            elif not c.isspace() and c != ":":
+                self._value_started(i)
+        self._pos = len(text)
+        return changed
+
+    def _value_started(self, i):
+        if self._depth == 1 and self._key is not None and self._value_start is None:
+            self._value_start = i
+        elif self._depth == 2 and self._array_key is not None and self._item_start is None:
+            self._item_start = i
+
+    def _string_closed(self, i):
+        if self._depth == 1 and self._key is None and self._key_start is not None:
+            self._key = self._loads(self._text[self._key_start:i + 1])
+            self._key_start = None
+        elif self._depth == 1 and self._value_start == self._string_start:
+            return self._finish_value(self._text[self._value_start:i + 1])
+        elif self._depth == 2 and self._item_start == self._string_start:
+            return self._finish_item(self._text[self._item_start:i + 1])
+        return False
+
+    def _finish_value(self, raw):
+        key = self._key
+        self._key = None
+        self._value_start = None
+        self._array_key = None
+        value = self._loads(raw)
+        if key is None or value is _INVALID:
+            return False
+        self.partial[key] = value
+        return True
+
+    def _finish_item(self, raw):
+        self._item_start = None
+        value = self._loads(raw)
+        if value is _INVALID:
+            return False
+        self.partial[self._array_key].append(value)
+        return True
+
+    @staticmethod
+    def _loads(raw):
+        try:
+            return json.loads(raw)
+        except ValueError:
+            return _INVALID
+
+
+_INVALID = object()
@@ -0,0 +1,229 @@
+import os
+import time
+import random
+import threading
+import httpx
+from mistralai import Mistral
+
+# Shared Mistral client for OCR, resume and quiz services: one keep-alive
+# connection pool, per-model rate limits, retries and a circuit breaker.
+MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
+if not MISTRAL_API_KEY:
+    raise ValueError("MISTRAL_API_KEY not found in environment variables")
+
+# Point at a local stub server for testing, e.g. http://127.0.0.1:8089
+MISTRAL_SERVER_URL = os.environ.get("MISTRAL_SERVER_URL")
+MISTRAL_TIMEOUT_SECONDS = float(os.environ.get("MISTRAL_TIMEOUT_SECONDS", "120"))
+MISTRAL_MAX_CONNECTIONS = int(os.environ.get("MISTRAL_MAX_CONNECTIONS", "20"))
+MISTRAL_MAX_RETRIES = int(os.environ.get("MISTRAL_MAX_RETRIES", "3"))
+MISTRAL_BACKOFF_BASE = float(os.environ.get("MISTRAL_BACKOFF_BASE", "1.0"))
+MISTRAL_BACKOFF_MAX = float(os.environ.get("MISTRAL_BACKOFF_MAX", "30"))
+# Requests per second per model, e.g. "mistral-large-latest=1,mistral-ocr-2512=2"
+MISTRAL_RATE_LIMITS = os.environ.get("MISTRAL_RATE_LIMITS", "")
+MISTRAL_DEFAULT_RPS = float(os.environ.get("MISTRAL_DEFAULT_RPS", "5"))
+MISTRAL_BREAKER_THRESHOLD = int(os.environ.get("MISTRAL_BREAKER_THRESHOLD", "5"))
+MISTRAL_BREAKER_COOLDOWN = float(os.environ.get("MISTRAL_BREAKER_COOLDOWN", "30"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+_http_client = httpx.Client(
+    timeout=MISTRAL_TIMEOUT_SECONDS,
+    limits=httpx.Limits(max_connections=MISTRAL_MAX_CONNECTIONS,
+                        max_keepalive_connections=MISTRAL_MAX_CONNECTIONS),
+)
+
+client = Mistral(api_key=MISTRAL_API_KEY, server_url=MISTRAL_SERVER_URL, client=_http_client)
+
+
+class CircuitOpenError(Exception):
+    """Raised without calling Mistral while the upstream is considered degraded."""
+
+
+class TokenBucket:
+    """Thread-safe token bucket: `rate` tokens per second, bursts up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available."""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class CircuitBreaker:
+    """Opens after `threshold` consecutive upstream failures and lets one
+    trial call through after `cooldown` seconds (half-open)."""
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.cooldown:
+                return "half_open"
+            return "open"
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            if time.monotonic() - self._opened_at < self.cooldown or self._trial_in_flight:
+                raise CircuitOpenError("Mistral API is temporarily unavailable. Please try again shortly.")
+            self._trial_in_flight = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_in_flight = False
+
+    def record_other(self):
+        """A call that failed for reasons that say nothing about upstream health
+        (client errors, rate limiting): keep the failure count and the open
+        state, and only free the trial slot so a later call can be the trial."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._trial_in_flight or self._failures >= self.threshold:
+                self._opened_at = time.monotonic()
+            self._trial_in_flight = False
+
+
+def _parse_rate_limits(spec):
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            model, rps = item.split("=", 1)
+            limits[model.strip()] = float(rps)
+    return limits
+
+
+_rate_limits = _parse_rate_limits(MISTRAL_RATE_LIMITS)
+_buckets = {}
+_buckets_lock = threading.Lock()
+breaker = CircuitBreaker(MISTRAL_BREAKER_THRESHOLD, MISTRAL_BREAKER_COOLDOWN)
+
+_counters = {"calls": 0, "retries": 0, "failures": 0, "rejected": 0,
+             "prompt_tokens": 0, "completion_tokens": 0}
+_counters_lock = threading.Lock()
+
+
+def _bucket(model):
+    with _buckets_lock:
+        if model not in _buckets:
+            _buckets[model] = TokenBucket(_rate_limits.get(model, MISTRAL_DEFAULT_RPS))
+        return _buckets[model]
+
+
+def _count(name, value=1):
+    with _counters_lock:
+        _counters[name] += value
+
+
+def record_usage(usage):
+    """Add a response's token usage to the counters."""
+    if usage is not None:
+        _count("prompt_tokens", getattr(usage, "prompt_tokens", 0) or 0)
+        _count("completion_tokens", getattr(usage, "completion_tokens", 0) or 0)
+
+
+def _status_code(error):
+    status = getattr(error, "status_code", None)
+    if status is None and getattr(error, "response", None) is not None:
+        status = getattr(error.response, "status_code", None)
+    return status
+
+
+def _is_retryable(error):
+    if isinstance(error, (httpx.TimeoutException, httpx.TransportError)):
+        return True
+    return _status_code(error) in RETRYABLE_STATUS
+
+
+def _backoff(attempt):
+    """Full-jitter exponential backoff."""
+    return random.uniform(0, min(MISTRAL_BACKOFF_MAX, MISTRAL_BACKOFF_BASE * 2 ** attempt))
+
+
+def call(model, fn, **kwargs):
+    """Call fn(model=model, **kwargs) with rate limiting, retries and the circuit breaker."""
+    bucket = _bucket(model)
+    for attempt in range(MISTRAL_MAX_RETRIES + 1):
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            _count("rejected")
+            raise
+        bucket.acquire()
+        _count("calls")
+        try:
+            result = fn(model=model, **kwargs)
+        except Exception as e:
+            retryable = _is_retryable(e)
+            # Rate limiting means "slow down", not "upstream is broken"
+            if retryable and _status_code(e) != 429:
+                breaker.record_failure()
+            else:
+                breaker.record_other()
+            if not retryable or attempt == MISTRAL_MAX_RETRIES:
+                _count("failures")
+                raise
+            _count("retries")
+            delay = _backoff(attempt)
+            print(f"Mistral {model} call failed ({_status_code(e) or type(e).__name__}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            record_usage(getattr(result, "usage", None))
+            return result
+
+
+def chat_complete(model, **kwargs):
+    return call(model, client.chat.complete, **kwargs)
+
+
+def chat_stream(model, **kwargs):
+    """Open a streamed chat completion. Retries only cover opening the stream."""
+    return call(model, client.chat.stream, **kwargs)
+
+
+def ocr_process(model, **kwargs):
+    return call(model, client.ocr.process, **kwargs)
+
+
+def embed(model, **kwargs):
+    return call(model, client.embeddings.create, **kwargs)
+
+
+def stats():
+    """Call/retry/failure/token counters and breaker state for this worker."""
+    with _counters_lock:
+        counters = dict(_counters)
+    counters["breaker"] = breaker.state
+    return counters
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import threading
+import mistral_client
+from json_stream import PartialJSONObject
+
+# Model tiering: each task starts on the small model while its prompt is
+# short enough, and escalates to the large model when the small model's
+# output fails validation or a confidence check.
+SMALL_MODEL = os.environ.get("LLM_SMALL_MODEL", "mistral-small-latest")
+LARGE_MODEL = os.environ.get("LLM_LARGE_MODEL", "mistral-large-latest")
+MODEL_ROUTING = os.environ.get("MODEL_ROUTING", "1") == "1"
+
+# Task -> longest prompt (characters) still sent to the small model; 0 = always large
+ROUTES = {
+    "skill_assessment": int(os.environ.get("ROUTE_SKILL_ASSESSMENT_MAX_CHARS", "100000")),
+    "quiz": int(os.environ.get("ROUTE_QUIZ_MAX_CHARS", "12000")),
+    "structure": int(os.environ.get("ROUTE_STRUCTURE_MAX_CHARS", "8000")),
+    "score": int(os.environ.get("ROUTE_SCORE_MAX_CHARS", "8000")),
+    "structure_score": int(os.environ.get("ROUTE_STRUCTURE_SCORE_MAX_CHARS", "6000")),
+}
+
+# Part of every cache version: results depend on which models can answer
+MODEL_TAG = f"{SMALL_MODEL}>{LARGE_MODEL}" if MODEL_ROUTING else LARGE_MODEL
+
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def route(task, prompt_chars):
+    """The model a task starts on for a prompt of this size."""
+    if not MODEL_ROUTING or prompt_chars > ROUTES.get(task, 0):
+        return LARGE_MODEL
+    return SMALL_MODEL
+
+
+def _complete(model, prompt, on_partial=None):
+    """Run a JSON-mode completion and return the parsed object.
+
+    With `on_partial`, the completion is streamed and on_partial(fields) is
+    called with the fields received so far each time another one completes.
+    """
+    messages = [{"role": "user", "content": prompt}]
+    if on_partial is None:
+        response = mistral_client.chat_complete(
+            model=model,
+            messages=messages,
+            response_format={"type": "json_object"}
+        )
+        return json.loads(response.choices[0].message.content)
+
+    parser = PartialJSONObject()
+    stream = mistral_client.chat_stream(
+        model=model,
+        messages=messages,
+        response_format={"type": "json_object"}
+    )
+    with stream as events:
+        for event in events:
+            # The final chunk carries the token usage for the whole stream
+            mistral_client.record_usage(getattr(event.data, "usage", None))
+            if not event.data.choices:
+                continue
+            content = event.data.choices[0].delta.content
+            if isinstance(content, str) and content and parser.feed(content):
+                try:
+                    on_partial(dict(parser.partial))
+                except Exception as e:
+                    print(f"Partial result callback error: {e}")
+    return json.loads(parser.text)
+
+
+def _record(task, model, seconds, outcome):
+    with _stats_lock:
+        entry = _stats.setdefault(f"{task}:{model}", {"calls": 0, "seconds": 0.0, "rejected": 0})
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        if outcome == "rejected":
+            entry["rejected"] += 1
+    print(f"Model route {task}: {model} {outcome} in {seconds:.2f}s")
+
+
+def complete_json(task, prompt, check=None, on_partial=None, strict=False):
+    """Run a JSON completion for `task` on the routed model.
+
+    `check(result)` raises ValueError when the output fails schema
+    validation or a confidence check. A rejected small-model answer is
+    retried on the large model. The large model's answer is returned even
+    if it fails the check, unless `strict` is set, in which case the
+    ValueError propagates (as does unparseable JSON).
+    """
+    model = route(task, len(prompt))
+    while True:
+        start = time.perf_counter()
+        try:
+            result = _complete(model, prompt, on_partial)
+        except ValueError:
+            _record(task, model, time.perf_counter() - start, "rejected")
+            if model == LARGE_MODEL:
+                raise
+            print(f"Model route {task}: escalating to {LARGE_MODEL} (invalid JSON)")
+            model = LARGE_MODEL
+            continue
+
+        try:
+            if check:
+                check(result)
+        except ValueError as e:
+            _record(task, model, time.perf_counter() - start, "rejected")
+            if model == LARGE_MODEL:
+                if strict:
+                    raise
+                print(f"Model route {task}: keeping {LARGE_MODEL} output despite failed check ({e})")
+                return result
+            print(f"Model route {task}: escalating to {LARGE_MODEL} ({e})")
+            model = LARGE_MODEL
+            continue
+
+        _record(task, model, time.perf_counter() - start, "ok")
+        return result
+
+
+def stats():
+    """Calls, mean latency and rejections per task and model in this worker."""
+    with _stats_lock:
+        return {
+            key: {
+                "calls": entry["calls"],
+                "rejected": entry["rejected"],
+                "mean_seconds": round(entry["seconds"] / entry["calls"], 3)
+            }
+            for key, entry in _stats.items()
+        }
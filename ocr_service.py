@@ -1,30 +1,203 @@
+import io
 import os
-import base64
-from mistralai import Mistral
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import mistral_client
+from upload_service import pdf_data_uri
 
-# Initialize Mistral client
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-if not MISTRAL_API_KEY:
-    raise ValueError("MISTRAL_API_KEY not found in environment variables")
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:  # Without pypdf every page goes to remote OCR
+    PdfReader = PdfWriter = None
 
-client = Mistral(api_key=MISTRAL_API_KEY)
+OCR_MODEL = "mistral-ocr-2512"
+# Bump when the text output format changes so cached OCR results are not reused
+OCR_VERSION = f"{OCR_MODEL}:v2"
 
-def extract_resume_with_ocr(pdf_bytes):
-    """Use Mistral OCR to extract text from PDF resume."""
-    pdf_base64 = base64.b64encode(pdf_bytes).decode("utf-8")
-    
-    ocr_response = client.ocr.process(
-        model="mistral-ocr-2512",
+# A page's embedded text layer is used as-is when it has at least this many
+# characters and is mostly readable; anything sparser is treated as scanned
+LOCAL_TEXT_MIN_CHARS = int(os.environ.get("OCR_LOCAL_MIN_CHARS", "200"))
+LOCAL_TEXT_MIN_READABLE = 0.7
+
+# Long documents are split into page ranges that are OCR'd concurrently.
+# OCR_PARALLEL_MIN_PAGES=0 turns this off (one request for the whole document).
+OCR_PARALLEL_MIN_PAGES = int(os.environ.get("OCR_PARALLEL_MIN_PAGES", "4"))
+OCR_PAGES_PER_REQUEST = int(os.environ.get("OCR_PAGES_PER_REQUEST", "2"))
+OCR_PAGE_WORKERS = int(os.environ.get("OCR_PAGE_WORKERS", "4"))
+OCR_PAGE_RETRIES = int(os.environ.get("OCR_PAGE_RETRIES", "2"))
+
+_page_pool = ThreadPoolExecutor(max_workers=OCR_PAGE_WORKERS, thread_name_prefix="ocr-page")
+
+_counters = {
+    "documents_local": 0,   # every page came from the text layer
+    "documents_mixed": 0,   # some pages needed remote OCR
+    "documents_remote": 0,  # every page needed remote OCR
+    "pages_local": 0,
+    "pages_remote": 0,
+}
+_counters_lock = threading.Lock()
+
+
+def _usable_text(text):
+    """Text-density check: enough characters, and not mostly glyph garbage."""
+    text = (text or "").strip()
+    if len(text) < LOCAL_TEXT_MIN_CHARS:
+        return None
+    readable = sum(1 for c in text if c.isalnum() or c.isspace() or c in ".,;:-()@/+&'\"%#")
+    if readable / len(text) < LOCAL_TEXT_MIN_READABLE:
+        return None
+    return text
+
+
+def open_pdf(pdf_bytes):
+    """Open a PDF with pypdf, or return None if that isn't possible."""
+    if PdfReader is None:
+        return None
+    try:
+        reader = PdfReader(io.BytesIO(pdf_bytes))
+        return None if reader.is_encrypted else reader
+    except Exception as e:
+        print(f"Local PDF read failed: {e}")
+        return None
+
+
+def extract_local_pages(reader):
+    """Read each page's embedded text layer.
+
+    Returns a list with the text of each page, or None for pages that look
+    scanned. Returns None if the text layer can't be read at all.
+    """
+    try:
+        return [_usable_text(page.extract_text()) for page in reader.pages]
+    except Exception as e:
+        print(f"Local PDF text extraction failed: {e}")
+        return None
+
+
+def _ocr_remote(pdf_bytes, pages=None):
+    """Run Mistral OCR on the document (optionally only some 0-based pages).
+
+    Returns {page index: markdown}.
+    """
+    ocr_response = mistral_client.ocr_process(
+        model=OCR_MODEL,
         document={
             "type": "document_url",
-            "document_url": f"data:application/pdf;base64,{pdf_base64}"
+            "document_url": pdf_data_uri(pdf_bytes)
         },
+        pages=pages,
         include_image_base64=False
     )
-    
-    all_text = ""
-    for page in ocr_response.pages:
-        all_text += f"\n--- Page {page.index + 1} ---\n"
-        all_text += page.markdown
-    
-    return all_text
+    return {page.index: page.markdown for page in ocr_response.pages}
+
+
+def _subset_pdf(reader, indices):
+    """A new PDF holding only the given 0-based pages of reader."""
+    writer = PdfWriter()
+    for index in indices:
+        writer.add_page(reader.pages[index])
+    out = io.BytesIO()
+    writer.write(out)
+    return out.getvalue()
+
+
+def _ocr_chunk(chunk_pdf, indices):
+    """OCR a sub-PDF whose pages are `indices` of the original document."""
+    remote = _ocr_remote(chunk_pdf)
+    return {indices[i]: markdown for i, markdown in remote.items()}
+
+
+def _ocr_chunk_with_retry(chunk_pdf, subset, indices):
+    """OCR one page range; if it fails, retry its pages one at a time.
+
+    Only the pages of the failed range are redone, never the whole document.
+    """
+    try:
+        return _ocr_chunk(chunk_pdf, indices)
+    except Exception as e:
+        print(f"OCR failed for pages {[i + 1 for i in indices]}: {e}")
+
+    pages = {}
+    for index in indices:
+        for attempt in range(OCR_PAGE_RETRIES + 1):
+            try:
+                pages.update(_ocr_chunk(subset([index]), [index]))
+                break
+            except Exception as e:
+                if attempt == OCR_PAGE_RETRIES:
+                    raise
+                print(f"Retrying OCR for page {index + 1}: {e}")
+                time.sleep(2 ** attempt)
+    return pages
+
+
+def _ocr_parallel(reader, indices):
+    """OCR the given pages in ranges of OCR_PAGES_PER_REQUEST on the page pool."""
+    size = max(1, OCR_PAGES_PER_REQUEST)
+    chunks = [indices[i:i + size] for i in range(0, len(indices), size)]
+    # pypdf readers are not thread-safe, so sub-PDFs are built one at a time
+    reader_lock = threading.Lock()
+
+    def subset(chunk):
+        with reader_lock:
+            return _subset_pdf(reader, chunk)
+
+    futures = [_page_pool.submit(_ocr_chunk_with_retry, subset(chunk), subset, chunk)
+               for chunk in chunks]
+    pages = {}
+    for future in futures:
+        pages.update(future.result())
+    return pages
+
+
+def _ocr_pages(pdf_bytes, reader, indices=None):
+    """Remote OCR for some pages (all when indices is None), in parallel for long documents."""
+    if indices is None and reader is not None:
+        indices = list(range(len(reader.pages)))
+    if (reader is not None and PdfWriter is not None and OCR_PARALLEL_MIN_PAGES > 0
+            and len(indices) >= OCR_PARALLEL_MIN_PAGES):
+        return _ocr_parallel(reader, indices)
+    return _ocr_remote(pdf_bytes, indices)
+
+
+def _count(**increments):
+    with _counters_lock:
+        for name, value in increments.items():
+            _counters[name] += value
+
+
+def extract_resume_with_ocr(pdf_bytes):
+    """Extract text from a PDF resume (any bytes-like object), page by page.
+
+    Born-digital pages are read from the PDF's own text layer; only scanned
+    or image-only pages are sent to Mistral OCR, split into concurrent page
+    ranges for long documents. Output is the same "--- Page N ---"
+    delimited text either way, joined once in page order.
+    """
+    reader = open_pdf(pdf_bytes)
+    local_pages = extract_local_pages(reader) if reader is not None else None
+
+    if local_pages is None:
+        pages = _ocr_pages(pdf_bytes, reader)
+        _count(documents_remote=1, pages_remote=len(pages))
+    else:
+        missing = [i for i, text in enumerate(local_pages) if text is None]
+        remote = _ocr_pages(pdf_bytes, reader, missing) if missing else {}
+        pages = {i: text for i, text in enumerate(local_pages) if text is not None}
+        pages.update(remote)
+        if not missing:
+            _count(documents_local=1)
+        elif len(missing) == len(local_pages):
+            _count(documents_remote=1)
+        else:
+            _count(documents_mixed=1)
+        _count(pages_local=len(local_pages) - len(missing), pages_remote=len(remote))
+
+    return "".join(f"\n--- Page {index + 1} ---\n{pages[index]}" for index in sorted(pages))
+
+
+def stats():
+    """How often each extraction route was taken in this worker."""
+    with _counters_lock:
+        return dict(_counters)
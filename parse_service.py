@@ -0,0 +1,306 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import cache_service
+import candidate_index
+import cv_texts
+import ocr_service
+import resume_service
+import skill_taxonomy
+
+# Threads shared by every pipeline stage (upload, OCR, LLM calls, DB writes)
+PIPELINE_THREADS = int(os.environ.get("PIPELINE_THREADS", "16"))
+# Stream structuring/scoring completions and report fields as they arrive
+LLM_STREAMING = os.environ.get("LLM_STREAMING", "1") == "1"
+# "separate": structure, then score (two LLM calls); "combined": one call for both
+PARSE_MODES = ("separate", "combined")
+PARSE_MODE = os.environ.get("PARSE_MODE", "separate")
+
+_stage_pool = ThreadPoolExecutor(max_workers=PIPELINE_THREADS, thread_name_prefix="stage")
+
+
+class PipelineError(Exception):
+    """A pipeline stage failed. `results` holds the stages that did finish."""
+
+    def __init__(self, stage, error, results):
+        super().__init__(str(error))
+        self.stage = stage
+        self.error = error
+        self.results = results
+
+
+def run_graph(stages, report=None):
+    """Run a small dependency graph of stages on the shared stage pool.
+
+    `stages` maps name -> (dependency names, fn). Each fn is called with the
+    results of its dependencies as keyword arguments, as soon as they are all
+    available. Returns (results, timings) where timings holds the start offset
+    and duration of every stage in seconds.
+    """
+    results = {}
+    timings = {}
+    started = set()
+    failures = []
+    lock = threading.Lock()
+    finished = threading.Event()
+    t0 = time.perf_counter()
+    in_flight = [0]
+
+    def run(name, fn, inputs):
+        start = time.perf_counter()
+        if report:
+            report(name)
+        try:
+            return fn(**inputs)
+        finally:
+            timings[name] = {
+                "start": round(start - t0, 3),
+                "duration": round(time.perf_counter() - start, 3)
+            }
+
+    def ready_stages():
+        return [name for name, (deps, _) in stages.items()
+                if name not in started and all(d in results for d in deps)]
+
+    def launch(names):
+        for name in names:
+            deps, fn = stages[name]
+            future = _stage_pool.submit(run, name, fn, {d: results[d] for d in deps})
+            future.add_done_callback(lambda f, name=name: on_done(name, f))
+
+    def on_done(name, future):
+        with lock:
+            in_flight[0] -= 1
+            error = future.exception()
+            if error is not None:
+                failures.append((name, error))
+            else:
+                results[name] = future.result()
+            # After a failure, let in-flight stages drain but start nothing new
+            ready = [] if failures else ready_stages()
+            started.update(ready)
+            in_flight[0] += len(ready)
+            if in_flight[0] == 0:
+                finished.set()
+        launch(ready)
+
+    with lock:
+        ready = ready_stages()
+        started.update(ready)
+        in_flight[0] += len(ready)
+    launch(ready)
+    finished.wait()
+
+    if failures:
+        stage, error = failures[0]
+        raise PipelineError(stage, error, results)
+    return results, timings
+
+
+def safe_storage_path(user_id, filename):
+    """Build a unique storage path for an uploaded resume."""
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    safe_filename = "".join([c for c in filename if c.isalnum() or c in "._- "]).strip()
+    return f"{user_id}/{timestamp}_{safe_filename}"
+
+
+def upload_pdf(user_client, user_id, filename, pdf):
+    """Upload the PDF (bytes or a local file path) to the resumes bucket.
+
+    Returns the storage path, or None on failure.
+    """
+    file_path = safe_storage_path(user_id, filename)
+    try:
+        user_client.storage.from_('resumes').upload(
+            path=file_path,
+            file=pdf,
+            file_options={"content-type": "application/pdf"}
+        )
+    except Exception as upload_error:
+        print(f"Storage upload error: {upload_error}")
+        # Continue even if upload fails, but file_path will be null
+        return None
+    return file_path
+
+
+def cache_keys(pdf_bytes):
+    """Cache keys for each stage: PDF content hash chained with the prompt/model versions."""
+    return keys_for_hash(cache_service.content_hash(pdf_bytes))
+
+
+def keys_for_hash(pdf_hash):
+    """cache_keys() for a PDF known only by its content hash (cvs.pdf_hash)."""
+    ocr_key = cache_service.make_key(pdf_hash, ocr_service.OCR_VERSION)
+    structure_key = cache_service.make_key(ocr_key, resume_service.STRUCTURE_VERSION)
+    score_key = cache_service.make_key(structure_key, resume_service.SCORE_VERSION)
+    combined_key = cache_service.make_key(ocr_key, resume_service.COMBINED_VERSION)
+    return {"pdf": pdf_hash, "ocr": ocr_key, "structure": structure_key, "score": score_key,
+            "combined": combined_key}
+
+
+def structure_and_score(keys, raw_text, on_partial=None, on_score=None):
+    """Combined-mode analysis through the cache. Returns (resume_data, score_data)."""
+    def compute():
+        resume_data, score_data = resume_service.structure_and_score_resume(raw_text, on_partial, on_score)
+        return {"resume_data": resume_data, "score_data": score_data}
+
+    analysis = cache_service.cached("combined", keys["combined"], compute)
+    return analysis["resume_data"], analysis["score_data"]
+
+
+def analyze_pdf(pdf_bytes, keys=None, mode=None):
+    """OCR, structure and score one PDF through the cache, without saving it.
+
+    Returns (raw_text, resume_data, score_data).
+    """
+    keys = keys or cache_keys(pdf_bytes)
+    raw_text = cache_service.cached(
+        "ocr", keys["ocr"], lambda: ocr_service.extract_resume_with_ocr(pdf_bytes))
+    if (mode or PARSE_MODE) == "combined":
+        return (raw_text,) + structure_and_score(keys, raw_text)
+    resume_data = cache_service.cached(
+        "structure", keys["structure"], lambda: resume_service.structure_resume_data(raw_text))
+    score_data = cache_service.cached(
+        "score", keys["score"], lambda: resume_service.score_resume(resume_data, raw_text))
+    return raw_text, resume_data, score_data
+
+
+def run_parse(report, user_client, user_id, filename, pdf_bytes, pdf_path=None, mode=None):
+    """Parse one resume and save it to the cvs table.
+
+    `pdf_bytes` may be any bytes-like object (e.g. a SpooledPDF buffer); when
+    `pdf_path` is given the storage upload streams from that file instead.
+
+    The storage upload runs alongside OCR + structuring, and scoring runs
+    alongside the cvs insert, so latency is roughly
+    max(OCR + structure, upload) + score rather than the sum of every step.
+
+    In "combined" mode one LLM call (the "analysis" stage) returns both the
+    structured data and the score, and the row is inserted with both.
+
+    While the LLM responses stream in, partially received resume_data and
+    score_data are published through `report` as job progress.
+    """
+    # Identical PDFs reuse earlier OCR/LLM results keyed by content hash + prompt version
+    keys = cache_keys(pdf_bytes)
+    mode = mode or PARSE_MODE
+
+    def upload():
+        return upload_pdf(user_client, user_id, filename, pdf_path or bytes(pdf_bytes))
+
+    def ocr():
+        return cache_service.cached(
+            "ocr", keys["ocr"], lambda: ocr_service.extract_resume_with_ocr(pdf_bytes))
+
+    def partial_reporter(stage, field):
+        if not (report and LLM_STREAMING):
+            return None
+        return lambda fields: report(stage, **{field: fields})
+
+    def structuring(ocr):
+        on_partial = partial_reporter("structuring", "resume_data")
+        return cache_service.cached(
+            "structure", keys["structure"], lambda: resume_service.structure_resume_data(ocr, on_partial))
+
+    def scoring(ocr, structuring):
+        on_partial = partial_reporter("scoring", "score_data")
+        return cache_service.cached(
+            "score", keys["score"], lambda: resume_service.score_resume(structuring, ocr, on_partial))
+
+    structure_version, score_version = resume_service.stored_versions(mode)
+
+    def saving(structuring, upload, ocr, score_data=None):
+        try:
+            result = user_client.table('cvs').insert({
+                "user_id": user_id,
+                "filename": filename,
+                "resume_data": structuring,
+                "score_data": score_data,
+                "file_path": upload,
+                "skill_ids": skill_taxonomy.resume_skill_ids(structuring),
+                "pdf_hash": keys["pdf"],
+                "structure_version": structure_version,
+                "score_version": score_version if score_data is not None else None
+            }).execute()
+            cv_id = result.data[0]['id'] if result.data else None
+        except Exception as db_error:
+            print(f"Database error: {db_error}")
+            return None
+        candidate_index.index_cvs([(cv_id, user_id, structuring)])
+        # Keep the OCR text so re-scoring and re-structuring never OCR this PDF again
+        try:
+            cv_texts.save(user_client, cv_id, user_id, ocr)
+        except Exception as db_error:
+            print(f"Database error saving OCR text: {db_error}")
+        return cv_id
+
+    def saving_score(saving, scoring):
+        if saving:
+            try:
+                user_client.table('cvs').update({
+                    "score_data": scoring,
+                    "score_version": score_version
+                }).eq('id', saving).execute()
+            except Exception as db_error:
+                print(f"Database error saving score: {db_error}")
+
+    def analysis(ocr):
+        return structure_and_score(keys, ocr, partial_reporter("analysis", "resume_data"),
+                                    partial_reporter("analysis", "score_data"))
+
+    def saving_analysis(analysis, upload, ocr):
+        return saving(analysis[0], upload, ocr, analysis[1])
+
+    if mode == "combined":
+        stages = {
+            "upload": ((), upload),
+            "ocr": ((), ocr),
+            "analysis": (("ocr",), analysis),
+            "saving": (("analysis", "upload", "ocr"), saving_analysis),
+        }
+    else:
+        stages = {
+            "upload": ((), upload),
+            "ocr": ((), ocr),
+            "structuring": (("ocr",), structuring),
+            "scoring": (("ocr", "structuring"), scoring),
+            "saving": (("structuring", "upload", "ocr"), saving),
+            "saving_score": (("saving", "scoring"), saving_score),
+        }
+
+    t0 = time.perf_counter()
+    try:
+        results, timings = run_graph(stages, report)
+    except PipelineError as e:
+        # Scoring runs alongside the insert, so the cvs row may already exist;
+        # remove it first (cv_texts and cv_embeddings cascade) so no row is
+        # left pointing at the PDF deleted below
+        cv_id = e.results.get("saving")
+        if cv_id:
+            try:
+                user_client.table('cvs').delete().eq('id', cv_id).execute()
+                candidate_index.remove(cv_id)
+            except Exception as cleanup_error:
+                print(f"Database cleanup error: {cleanup_error}")
+                raise e.error
+        # Don't leave an orphaned PDF in storage when parsing failed
+        if e.results.get("upload"):
+            try:
+                user_client.storage.from_('resumes').remove([e.results["upload"]])
+            except Exception as cleanup_error:
+                print(f"Storage cleanup error: {cleanup_error}")
+        raise e.error
+    timings["total"] = round(time.perf_counter() - t0, 3)
+    print(f"Parse timings for {filename}: {timings}")
+
+    resume_data, score_data = (results["analysis"] if mode == "combined"
+                               else (results["structuring"], results["scoring"]))
+    return {
+        "cv_id": results["saving"],
+        "resume_data": resume_data,
+        "score_data": score_data,
+        "raw_text": results["ocr"],
+        "timings": timings
+    }
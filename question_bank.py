@@ -0,0 +1,215 @@
+"""Pre-generated skill assessment questions.
+
+Questions are pooled per normalized skill name and type in the
+skill_questions table, and every assessment samples a few from the pool, so
+starting an assessment is a database read instead of an LLM call. Skills
+with no pool yet are generated on demand and their questions kept. A
+background warmer fills the pools of the most common skills.
+
+The table holds correct answers, so it is accessed with the service role
+key (SUPABASE_SERVICE_ROLE_KEY). Without it the bank is disabled and every
+assessment is generated live, as before.
+
+Command line, e.g. from cron:
+
+    python question_bank.py [--top 50]
+"""
+import os
+import sys
+import random
+import hashlib
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from supabase import create_client
+import quiz_service
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+QUESTIONS_PER_ASSESSMENT = int(os.environ.get("QUESTIONS_PER_ASSESSMENT", "5"))
+QUESTION_POOL_SIZE = int(os.environ.get("QUESTION_POOL_SIZE", "25"))
+QUESTION_BANK_TOP_N = int(os.environ.get("QUESTION_BANK_TOP_N", "50"))
+# Seconds between warmer runs in the web process; 0 = only via the command line
+QUESTION_BANK_WARM_INTERVAL = int(os.environ.get("QUESTION_BANK_WARM_INTERVAL", "21600"))
+# Generation rounds allowed per skill and fill, so a model that keeps repeating
+# itself can't loop forever
+_MAX_FILL_ROUNDS = 10
+
+_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY) if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY else None
+_fill_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="question-bank")
+_filling = set()
+_filling_lock = threading.Lock()
+_warmer_started = False
+
+_counters = {"hits": 0, "misses": 0, "generated": 0}
+_counters_lock = threading.Lock()
+
+
+def enabled():
+    return _client is not None
+
+
+def normalize_skill(skill_name):
+    """Pool key for a skill name: lowercase with single spaces ("  Python 3 " -> "python 3")."""
+    return " ".join(skill_name.lower().split())
+
+
+def _count(name, value=1):
+    with _counters_lock:
+        _counters[name] += value
+
+
+def _question_hash(question):
+    text = " ".join(str(question.get("question", "")).lower().split())
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _pool(skill_key, skill_type):
+    result = _client.table('skill_questions').select('question').eq('skill_key', skill_key).eq(
+        'skill_type', skill_type).eq('prompt_version', quiz_service.SKILL_ASSESSMENT_VERSION).execute()
+    return [row['question'] for row in (result.data or [])]
+
+
+def _store(skill_key, skill_type, questions):
+    """Add questions to a pool, skipping ones it already has."""
+    rows = []
+    for question in questions:
+        question = {k: v for k, v in question.items() if k != "id"}
+        rows.append({
+            "skill_key": skill_key,
+            "skill_type": skill_type,
+            "prompt_version": quiz_service.SKILL_ASSESSMENT_VERSION,
+            "question_hash": _question_hash(question),
+            "question": question
+        })
+    if rows:
+        _client.table('skill_questions').upsert(
+            rows, on_conflict='skill_key,skill_type,prompt_version,question_hash', ignore_duplicates=True
+        ).execute()
+        _count("generated", len(rows))
+
+
+def _sample(questions):
+    """QUESTIONS_PER_ASSESSMENT random questions, numbered from 1."""
+    chosen = random.sample(questions, min(QUESTIONS_PER_ASSESSMENT, len(questions)))
+    return {"questions": [dict(question, id=i) for i, question in enumerate(chosen, 1)]}
+
+
+def fill(skill_name, skill_type, target=QUESTION_POOL_SIZE):
+    """Generate questions until the skill's pool holds at least `target`."""
+    skill_key = normalize_skill(skill_name)
+    pool = _pool(skill_key, skill_type)
+    for _ in range(_MAX_FILL_ROUNDS):
+        if len(pool) >= target:
+            break
+        assessment = quiz_service.generate_skill_assessment(
+            skill_name, skill_type, exclude=[question.get("question", "") for question in pool])
+        _store(skill_key, skill_type, assessment.get("questions", []))
+        new_pool = _pool(skill_key, skill_type)
+        if len(new_pool) == len(pool):
+            break  # Only duplicates came back
+        pool = new_pool
+    return len(pool)
+
+
+def _fill_in_background(skill_name, skill_type):
+    key = (normalize_skill(skill_name), skill_type)
+    with _filling_lock:
+        if key in _filling:
+            return
+        _filling.add(key)
+
+    def run():
+        try:
+            fill(skill_name, skill_type)
+        except Exception as e:
+            print(f"Question bank fill error for {skill_name}: {e}")
+        finally:
+            with _filling_lock:
+                _filling.discard(key)
+
+    _fill_pool.submit(run)
+
+
+def get_assessment(skill_name, skill_type):
+    """Assessment questions for a skill: sampled from the bank when its pool is
+    big enough, otherwise generated now (and kept for next time)."""
+    if not enabled():
+        return quiz_service.generate_skill_assessment(skill_name, skill_type)
+
+    skill_key = normalize_skill(skill_name)
+    try:
+        pool = _pool(skill_key, skill_type)
+    except Exception as e:
+        print(f"Question bank read error: {e}")
+        return quiz_service.generate_skill_assessment(skill_name, skill_type)
+
+    if len(pool) >= QUESTIONS_PER_ASSESSMENT:
+        _count("hits")
+        if len(pool) < QUESTION_POOL_SIZE:
+            _fill_in_background(skill_name, skill_type)
+        return _sample(pool)
+
+    _count("misses")
+    assessment = quiz_service.generate_skill_assessment(skill_name, skill_type)
+    try:
+        _store(skill_key, skill_type, assessment.get("questions", []))
+    except Exception as e:
+        print(f"Question bank write error: {e}")
+    _fill_in_background(skill_name, skill_type)
+    return assessment
+
+
+def warm(top_n=QUESTION_BANK_TOP_N):
+    """Fill the pools of the top_n most listed skills. Returns the number filled."""
+    result = _client.rpc('popular_skills', {"p_limit": top_n}).execute()
+    filled = 0
+    for row in result.data or []:
+        try:
+            fill(row['skill_key'], row['skill_type'])
+            filled += 1
+        except Exception as e:
+            print(f"Question bank warm error for {row['skill_key']}: {e}")
+    return filled
+
+
+def start_warmer():
+    """Run warm() shortly after startup and then every QUESTION_BANK_WARM_INTERVAL
+    seconds, on a daemon thread."""
+    global _warmer_started
+    if not enabled() or QUESTION_BANK_WARM_INTERVAL <= 0 or _warmer_started:
+        return
+    _warmer_started = True
+
+    def loop():
+        # Stagger workers so they don't all generate the same pools at once
+        stop = threading.Event()
+        stop.wait(random.uniform(0, 60))
+        while True:
+            try:
+                print(f"Question bank warmed {warm()} skills")
+            except Exception as e:
+                print(f"Question bank warmer error: {e}")
+            stop.wait(QUESTION_BANK_WARM_INTERVAL)
+
+    threading.Thread(target=loop, name="question-bank-warmer", daemon=True).start()
+
+
+def stats():
+    with _counters_lock:
+        return dict(_counters, enabled=enabled())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate assessment questions for the most common skills.")
+    parser.add_argument("--top", type=int, default=QUESTION_BANK_TOP_N)
+    args = parser.parse_args(argv)
+    if not enabled():
+        parser.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
+    print(f"Filled {warm(args.top)} skill question pools")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import cache_service
+import job_service
+import mistral_client
+import quiz_service
+import session_store
+
+# Speculative resume quizzes: generated in the background right after a
+# parse, stored in the session store (so they expire with SESSION_TTL_SECONDS)
+# keyed by resume content, and handed out when the user opens the quiz.
+QUIZ_PREFETCH = os.environ.get("QUIZ_PREFETCH", "1") == "1"
+QUIZ_PREFETCH_WORKERS = int(os.environ.get("QUIZ_PREFETCH_WORKERS", "2"))
+QUIZ_PREFETCH_MAX_PENDING = int(os.environ.get("QUIZ_PREFETCH_MAX_PENDING", "8"))
+# A prefetch still queued after this many seconds is dropped
+QUIZ_PREFETCH_MAX_WAIT = int(os.environ.get("QUIZ_PREFETCH_MAX_WAIT", "60"))
+# How long /api/quiz waits for a prefetch that is already running
+QUIZ_PREFETCH_JOIN_TIMEOUT = int(os.environ.get("QUIZ_PREFETCH_JOIN_TIMEOUT", "60"))
+
+_pool = ThreadPoolExecutor(max_workers=QUIZ_PREFETCH_WORKERS, thread_name_prefix="quiz-prefetch")
+_pending = OrderedDict()  # resume key -> future, oldest first
+_store = session_store.Namespace("quizzes")
+_lock = threading.RLock()  # cancel() runs the done callback, which takes it again
+
+_counters = {"started": 0, "shed": 0, "cancelled": 0, "expired": 0, "hits": 0, "joined": 0, "misses": 0}
+_counters_lock = threading.Lock()
+
+
+def _count(name):
+    with _counters_lock:
+        _counters[name] += 1
+
+
+def resume_key(resume_data):
+    """Cache key for a quiz: resume content hash + quiz prompt version."""
+    canonical = json.dumps(resume_data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+    return cache_service.make_key(cache_service.content_hash(canonical), quiz_service.QUIZ_VERSION)
+
+
+def _overloaded():
+    """Load-shedding rule: speculative work only runs when nothing real is waiting."""
+    return job_service.stats()["queued"] > 0 or mistral_client.breaker.state != "closed"
+
+
+def _generate(key, resume_data, queued_at):
+    if time.time() - queued_at > QUIZ_PREFETCH_MAX_WAIT or _overloaded():
+        _count("expired")
+        return None
+    quiz = quiz_service.generate_quiz(resume_data)
+    _store.put(key, quiz)
+    return quiz
+
+
+def _done(key, future):
+    with _lock:
+        if _pending.get(key) is future:
+            del _pending[key]
+    if not future.cancelled() and future.exception() is not None:
+        print(f"Quiz prefetch error: {future.exception()}")
+
+
+def prefetch(resume_data):
+    """Start generating the quiz for this resume in the background, if worth it."""
+    if not QUIZ_PREFETCH or not resume_data:
+        return
+    if _overloaded():
+        _count("shed")
+        return
+
+    key = resume_key(resume_data)
+    with _lock:
+        if key in _pending:
+            return
+        if len(_pending) >= QUIZ_PREFETCH_MAX_PENDING:
+            # Make room by cancelling the oldest prefetch that hasn't started;
+            # the newest upload is the likeliest to open its quiz soon
+            for old_key, old_future in list(_pending.items()):
+                if old_future.cancel():
+                    _pending.pop(old_key, None)  # usually already removed by _done
+                    _count("cancelled")
+                    break
+            else:
+                _count("shed")
+                return
+    if _store.get(key) is not None:
+        return
+
+    with _lock:
+        future = _pool.submit(_generate, key, resume_data, time.time())
+        _pending[key] = future
+    future.add_done_callback(lambda f: _done(key, f))
+    _count("started")
+
+
+def get_quiz(resume_data):
+    """The quiz for a resume: the prefetched one if ready (or still running),
+    otherwise generated now. A prefetched quiz is handed out only once, so a
+    retake gets new questions."""
+    key = resume_key(resume_data)
+    quiz = _store.get(key)
+    if quiz is not None:
+        _store.delete(key)
+        _count("hits")
+        return quiz
+
+    with _lock:
+        future = _pending.get(key)
+    # A prefetch still waiting in the queue is cancelled and done inline instead
+    if future is not None and not future.cancel():
+        try:
+            quiz = future.result(timeout=QUIZ_PREFETCH_JOIN_TIMEOUT)
+        except Exception as e:
+            print(f"Quiz prefetch join error: {e}")
+            quiz = None
+        if quiz is not None:
+            _store.delete(key)
+            _count("joined")
+            return quiz
+
+    _count("misses")
+    return quiz_service.generate_quiz(resume_data)
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    with _lock:
+        counters["pending"] = len(_pending)
+    return counters
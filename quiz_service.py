@@ -1,16 +1,40 @@
-import os
 import json
-from mistralai import Mistral
+import model_router
 
-# Initialize Mistral client
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-if not MISTRAL_API_KEY:
-    raise ValueError("MISTRAL_API_KEY not found in environment variables")
+# Bump when the skill assessment prompts change; banked questions are kept per version
+SKILL_ASSESSMENT_VERSION = "skill-assessment-v1"
+# Bump when the resume quiz prompt changes; prefetched quizzes are keyed by it
+QUIZ_VERSION = f"{model_router.MODEL_TAG}:quiz-v1"
 
-client = Mistral(api_key=MISTRAL_API_KEY)
+def validate_questions(quiz):
+    """Raise ValueError unless every question can be shown and graded."""
+    questions = quiz.get("questions") if isinstance(quiz, dict) else None
+    if not isinstance(questions, list) or not questions:
+        raise ValueError("no questions")
+    for question in questions:
+        if not isinstance(question, dict) or "id" not in question:
+            raise ValueError("question without an id")
+        if not isinstance(question.get("question"), str) or not isinstance(question.get("explanation"), str):
+            raise ValueError(f"question {question['id']} is missing its text or explanation")
+        answer = question.get("correct_answer")
+        if not isinstance(answer, str):
+            raise ValueError(f"question {question['id']} has no correct answer")
+        # Answers are graded by comparing against the chosen option's text
+        if question.get("type") == "true_false":
+            if answer.strip().lower() not in ("true", "false"):
+                raise ValueError(f"question {question['id']} has a non true/false answer")
+        else:
+            options = question.get("options")
+            if not isinstance(options, list) or len(options) < 2:
+                raise ValueError(f"question {question['id']} has no options")
+            if answer.strip().lower() not in [str(option).strip().lower() for option in options]:
+                raise ValueError(f"question {question['id']} answer is not one of its options")
 
-def generate_skill_assessment(skill_name, skill_type):
-    """Generate skill assessment questions for a specific skill."""
+def generate_skill_assessment(skill_name, skill_type, exclude=None):
+    """Generate skill assessment questions for a specific skill.
+
+    `exclude` lists existing question texts the new questions must not repeat.
+    """
     if skill_type == 'technical':
         prompt = f"""Generate 5 technical assessment questions for the skill: {skill_name}
 
@@ -55,13 +79,11 @@ Respond with JSON in this exact format:
     ]
 }}"""
 
-    response = client.chat.complete(
-        model="mistral-large-latest",
-        messages=[{"role": "user", "content": prompt}],
-        response_format={"type": "json_object"}
-    )
-    
-    return json.loads(response.choices[0].message.content)
+    if exclude:
+        avoid = "\n".join(f"- {question}" for question in exclude[-30:])
+        prompt += f"\n\nDo not repeat or rephrase any of these existing questions:\n{avoid}"
+
+    return model_router.complete_json("skill_assessment", prompt, validate_questions)
 
 def generate_quiz(resume_data):
     """Generate quiz questions from resume content."""
@@ -99,10 +121,4 @@ Respond with JSON in this exact format:
     ]
 }}"""
 
-    response = client.chat.complete(
-        model="mistral-large-latest",
-        messages=[{"role": "user", "content": quiz_prompt}],
-        response_format={"type": "json_object"}
-    )
-    
-    return json.loads(response.choices[0].message.content)
+    return model_router.complete_json("quiz", quiz_prompt, validate_questions)
@@ -0,0 +1,260 @@
+"""Re-run stale structuring and scoring after a prompt or model change.
+
+Every cvs row records the prompt versions its resume_data and score_data
+came from (see resume_service.PROMPT_VERSIONS). This job walks the table by
+id, and for each row whose versions are out of date re-runs only what is
+stale: structuring (and then scoring, which depends on it) or just scoring.
+The text comes from cv_texts, or else the cached OCR output for the row's
+PDF hash, so PDFs are not OCRed again; rows with neither are skipped unless
+--allow-ocr is given.
+
+Rows are paced by REPROCESS_ROWS_PER_MINUTE on top of the per-model Mistral
+rate limits, and the job pauses while interactive parse jobs are queued or
+the Mistral circuit breaker is open. Finished rows carry the new versions,
+so an interrupted run resumes by simply running again. Progress is exposed
+through stats() (and /api/metrics).
+
+Rows span every user, so this uses the service role key
+(SUPABASE_SERVICE_ROLE_KEY).
+
+Command line:
+
+    python reprocess.py [--dry-run] [--limit N] [--allow-ocr]
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+from supabase import create_client
+import cache_service
+import candidate_index
+import cv_texts
+import job_service
+import mistral_client
+import ocr_service
+import parse_service
+import resume_service
+import skill_taxonomy
+from bulk_ingest import Throttle
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_SERVICE_ROLE_KEY = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+
+REPROCESS_ROWS_PER_MINUTE = int(os.environ.get("REPROCESS_ROWS_PER_MINUTE", "20"))
+# Seconds between background passes in the web process; 0 = only via the command line
+REPROCESS_INTERVAL = int(os.environ.get("REPROCESS_INTERVAL", "0"))
+# How long to wait before re-checking while interactive work is queued
+_BUSY_WAIT_SECONDS = 5
+_PAGE_SIZE = 200
+
+_client = create_client(SUPABASE_URL, SUPABASE_SERVICE_ROLE_KEY) if SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY else None
+_run_lock = threading.Lock()
+_started = False
+
+_progress = {"running": False, "scanned": 0, "stale": 0, "structured": 0, "scored": 0,
+             "no_text": 0, "failed": 0, "last_id": None, "started_at": None, "finished_at": None}
+_progress_lock = threading.Lock()
+
+
+def enabled():
+    return _client is not None
+
+
+def _update(**fields):
+    with _progress_lock:
+        _progress.update(fields)
+
+
+def _count(name, value=1):
+    with _progress_lock:
+        _progress[name] += value
+
+
+def stale_stages(row):
+    """The stages a cvs row needs re-run: "structure" implies re-scoring too."""
+    if not resume_service.is_current("structure", row.get('structure_version')):
+        return ("structure", "score")
+    if not resume_service.is_current("score", row.get('score_version')):
+        return ("score",)
+    return ()
+
+
+def _wait_until_idle():
+    """Background work yields to queued parse jobs and an open circuit breaker.
+    A half-open breaker doesn't block: the next call is its trial."""
+    while job_service.stats()["queued"] > 0 or mistral_client.breaker.state == "open":
+        time.sleep(_BUSY_WAIT_SECONDS)
+
+
+def _pdf_hash(row):
+    """The row's PDF hash, hashing the stored PDF once for rows saved before it was recorded."""
+    if row.get('pdf_hash'):
+        return row['pdf_hash']
+    if not row.get('file_path'):
+        return None
+    pdf_bytes = _client.storage.from_('resumes').download(row['file_path'])
+    pdf_hash = cache_service.content_hash(pdf_bytes)
+    _client.table('cvs').update({"pdf_hash": pdf_hash}).eq('id', row['id']).execute()
+    return pdf_hash
+
+
+def _raw_text(row, keys, allow_ocr):
+    """Stored or cached OCR text for the row, or None (OCRing it again only if allowed).
+    Text found only in the cache or freshly OCRed is saved to cv_texts."""
+    raw_text = cv_texts.load(_client, row['id'])
+    if raw_text is not None:
+        return raw_text
+    raw_text = cache_service.get("ocr", keys["ocr"])
+    if raw_text is None and allow_ocr and row.get('file_path'):
+        pdf_bytes = _client.storage.from_('resumes').download(row['file_path'])
+        raw_text = cache_service.cached("ocr", keys["ocr"], lambda: ocr_service.extract_resume_with_ocr(pdf_bytes))
+    if raw_text is not None:
+        cv_texts.save(_client, row['id'], row['user_id'], raw_text)
+    return raw_text
+
+
+def reprocess_row(row, allow_ocr=False):
+    """Re-run the stale stages of one full cvs row. Returns the stages re-run, or None without text."""
+    stages = stale_stages(row)
+    if not stages:
+        return ()
+    pdf_hash = _pdf_hash(row)
+    if not pdf_hash:
+        return None
+    keys = parse_service.keys_for_hash(pdf_hash)
+    raw_text = _raw_text(row, keys, allow_ocr)
+    if raw_text is None:
+        return None
+
+    update = {}
+    resume_data = row['resume_data']
+    if "structure" in stages and parse_service.PARSE_MODE == "combined":
+        resume_data, score_data = parse_service.structure_and_score(keys, raw_text)
+        update["score_data"] = score_data
+        update["score_version"] = resume_service.COMBINED_VERSION
+        update["structure_version"] = resume_service.COMBINED_VERSION
+    else:
+        if "structure" in stages:
+            resume_data = cache_service.cached(
+                "structure", keys["structure"], lambda: resume_service.structure_resume_data(raw_text))
+            update["structure_version"] = resume_service.STRUCTURE_VERSION
+        # keys["score"] assumes resume_data came from the current structure prompt;
+        # otherwise key the score by the stored resume_data itself
+        score_key = keys["score"] if "structure" in stages else cache_service.make_key(
+            keys["ocr"], cache_service.content_hash(json.dumps(resume_data, sort_keys=True).encode("utf-8")),
+            resume_service.SCORE_VERSION)
+        update["score_data"] = cache_service.cached(
+            "score", score_key, lambda: resume_service.score_resume(resume_data, raw_text))
+        update["score_version"] = resume_service.SCORE_VERSION
+
+    if "structure" in stages:
+        update["resume_data"] = resume_data
+        update["skill_ids"] = skill_taxonomy.resume_skill_ids(resume_data)
+    _client.table('cvs').update(update).eq('id', row['id']).execute()
+    if "structure" in stages:
+        candidate_index.index_cvs([(row['id'], row['user_id'], resume_data)])
+    return stages
+
+
+def run(limit=None, dry_run=False, allow_ocr=False, rows_per_minute=REPROCESS_ROWS_PER_MINUTE, report=None):
+    """One pass over the cvs table. Returns the progress counters."""
+    if not _run_lock.acquire(blocking=False):
+        raise RuntimeError("A reprocessing run is already in progress")
+    try:
+        _update(running=True, scanned=0, stale=0, structured=0, scored=0, no_text=0, failed=0,
+                last_id=None, started_at=time.time(), finished_at=None)
+        throttle = Throttle(rows_per_minute)
+        processed = 0
+        last = None
+        while limit is None or processed < limit:
+            query = _client.table('cvs').select('id, structure_version, score_version')
+            if last:
+                query = query.gt('id', last)
+            page = query.order('id').limit(_PAGE_SIZE).execute().data or []
+            for summary in page:
+                _count("scanned")
+                if not stale_stages(summary):
+                    continue
+                _count("stale")
+                if dry_run:
+                    continue
+                if limit is not None and processed >= limit:
+                    break
+                _wait_until_idle()
+                throttle.wait()
+                processed += 1
+                try:
+                    row = _client.table('cvs').select('*').eq('id', summary['id']).execute().data[0]
+                    stages = reprocess_row(row, allow_ocr)
+                    if stages is None:
+                        _count("no_text")
+                    else:
+                        _count("structured", int("structure" in stages))
+                        _count("scored", int("score" in stages))
+                except Exception as e:
+                    print(f"Reprocess error for CV {summary['id']}: {e}")
+                    _count("failed")
+                if report:
+                    report(stats())
+            if page:
+                last = page[-1]['id']
+                _update(last_id=last)
+            if len(page) < _PAGE_SIZE:
+                break
+    finally:
+        _update(running=False, finished_at=time.time())
+        _run_lock.release()
+    return stats()
+
+
+def start():
+    """Run a pass every REPROCESS_INTERVAL seconds on a daemon thread, if enabled."""
+    global _started
+    if not enabled() or REPROCESS_INTERVAL <= 0 or _started:
+        return
+    _started = True
+
+    def loop():
+        stop = threading.Event()
+        while True:
+            try:
+                result = run()
+                print(f"Reprocessed {result['structured']} structures and {result['scored']} scores "
+                      f"({result['no_text']} without cached text, {result['failed']} failed)")
+            except Exception as e:
+                print(f"Reprocess error: {e}")
+            stop.wait(REPROCESS_INTERVAL)
+
+    threading.Thread(target=loop, name="reprocess", daemon=True).start()
+
+
+def stats():
+    with _progress_lock:
+        return dict(_progress, enabled=enabled(), versions=dict(resume_service.PROMPT_VERSIONS))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Re-run stale structuring/scoring after a prompt or model change.")
+    parser.add_argument("--limit", type=int, help="Re-run at most this many rows")
+    parser.add_argument("--dry-run", action="store_true", help="Only count stale rows")
+    parser.add_argument("--allow-ocr", action="store_true", help="OCR PDFs whose text isn't cached")
+    parser.add_argument("--rows-per-minute", type=int, default=REPROCESS_ROWS_PER_MINUTE)
+    args = parser.parse_args(argv)
+    if not enabled():
+        parser.error("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY are required")
+
+    def report(progress):
+        print(f"\r{progress['scanned']} scanned, {progress['stale']} stale, "
+              f"{progress['structured']} restructured, {progress['scored']} rescored, "
+              f"{progress['no_text']} without text, {progress['failed']} failed", end="", flush=True)
+
+    result = run(args.limit, args.dry_run, args.allow_ocr, args.rows_per_minute, report)
+    report(result)
+    print()
+    return 1 if result["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,188 @@
+import re
+
+# Deterministic pre-parsing of OCR/text-layer output: contact fields by regex
+# and a section splitter, so the LLM only gets the parts that need it.
+
+EMAIL_RE = re.compile(r"[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Za-z]{2,}")
+LINKEDIN_RE = re.compile(r"(?:https?://)?(?:[a-z]{2,3}\.)?linkedin\.com/in/[A-Za-z0-9_%-]+/?", re.IGNORECASE)
+PHONE_RE = re.compile(r"(?<![\w/.])\+?\(?\d[\d\s().-]{6,}\d(?![\w/])")
+YEAR_RANGE_RE = re.compile(r"^(?:19|20)\d{2}\s*[-–.]\s*(?:19|20)\d{2}$")
+
+PAGE_MARKER_RE = re.compile(r"^--- Page \d+ ---$")
+IMAGE_RE = re.compile(r"!\[[^\]]*\]\([^)]*\)")
+SEPARATOR_RUN_RE = re.compile(r"(?:\s*[|•·]\s*){2,}")
+MARKDOWN_HEADING_RE = re.compile(r"^\s*(#{1,6})\s+\S")
+
+# Canonical section -> headings that introduce it (compared after normalizing)
+SECTION_HEADINGS = {
+    "summary": ["summary", "professional summary", "profile", "professional profile", "personal profile",
+                "objective", "career objective", "about me", "about"],
+    "experience": ["experience", "work experience", "professional experience", "relevant experience",
+                   "employment", "employment history", "work history", "career history", "internships",
+                   "internship experience"],
+    "education": ["education", "academic background", "education and training", "academic qualifications",
+                  "educational background"],
+    "skills": ["skills", "technical skills", "core skills", "key skills", "core competencies", "competencies",
+               "skills and tools", "tools and technologies", "technologies", "soft skills", "skills summary"],
+    "certifications": ["certifications", "certificates", "certification", "licenses and certifications",
+                       "courses", "courses and certifications", "training"],
+    "languages": ["languages", "spoken languages", "language skills"],
+    "projects": ["projects", "personal projects", "academic projects", "key projects", "selected projects"],
+    # Never needed for structuring; dropped from the prompt
+    "ignored": ["references", "referees", "hobbies", "interests", "hobbies and interests", "declaration"],
+}
+
+_HEADING_LOOKUP = {heading: section for section, headings in SECTION_HEADINGS.items() for heading in headings}
+_MAX_HEADING_LENGTH = 40
+
+
+def _normalize_heading(line):
+    text = line.strip().strip("#*_= \t").rstrip(":").strip("*_ ")
+    text = text.replace("&", " and ").lower()
+    return re.sub(r"[^a-z ]+", " ", text).split()
+
+
+def heading_section(line):
+    """The canonical section a heading line introduces, or None."""
+    if not line.strip() or len(line.strip()) > _MAX_HEADING_LENGTH:
+        return None
+    return _HEADING_LOOKUP.get(" ".join(_normalize_heading(line)))
+
+
+def heading_level(line):
+    """1-6 for a markdown heading line, else None."""
+    match = MARKDOWN_HEADING_RE.match(line)
+    return len(match.group(1)) if match and len(line.strip()) <= _MAX_HEADING_LENGTH else None
+
+
+def looks_like_heading(line):
+    """A short line with no sentence punctuation or digits that is ALL CAPS,
+    or Title Case ending in a colon: how plain-text layouts mark headings."""
+    text = line.strip().strip("*_= \t")
+    if not text or len(text) > _MAX_HEADING_LENGTH or re.search(r"[\d.,;!?@/|()]", text):
+        return False
+    words = re.findall(r"[A-Za-z]+", text)
+    if not words:
+        return False
+    if text.isupper():
+        return True
+    return text.endswith(":") and all(word[0].isupper() or len(word) <= 3 for word in words)
+
+
+def _starts_own_section(line, current, current_level):
+    """Whether an unrecognised heading ends the current section.
+
+    Under a markdown section heading, only a markdown heading at the same or a
+    higher level does; under a plain-text one, markdown headings are content
+    (e.g. job titles), except that nothing is swallowed by an ignored section.
+    """
+    level = heading_level(line)
+    if current_level is not None:
+        return level is not None and level <= current_level
+    return current == "ignored" and (level is not None or looks_like_heading(line))
+
+
+def clean_lines(raw_text):
+    """OCR text as lines without page markers, image references or blank runs."""
+    lines = []
+    for line in raw_text.splitlines():
+        line = IMAGE_RE.sub("", line).rstrip()
+        if PAGE_MARKER_RE.match(line.strip()):
+            continue
+        if not line.strip() and (not lines or not lines[-1].strip()):
+            continue
+        lines.append(line)
+    return lines
+
+
+def split_sections(raw_text):
+    """Split resume text on recognised headings.
+
+    Returns (header, sections): the text before the first heading (usually
+    name and contact details) and {section: text}, in document order. A
+    section that appears more than once (e.g. across pages) is concatenated.
+
+    After the first recognised heading, an unrecognised heading that ends the
+    current section (see _starts_own_section) starts its own section, named
+    after the heading, so its text is passed through rather than merged into
+    (or dropped with) the section before it.
+    """
+    header = []
+    sections = {}
+    current = None
+    current_level = None
+    for line in clean_lines(raw_text):
+        section = heading_section(line)
+        if not section and current and _starts_own_section(line, current, current_level):
+            section = " ".join(_normalize_heading(line)) or None
+        if section:
+            current = section
+            current_level = heading_level(line)
+            sections.setdefault(section, [])
+            continue
+        (sections[current] if current else header).append(line)
+    return ("\n".join(header).strip(),
+            {name: "\n".join(lines).strip() for name, lines in sections.items()})
+
+
+def _find_phone(text):
+    for match in PHONE_RE.finditer(text):
+        candidate = match.group().strip()
+        digits = re.sub(r"\D", "", candidate)
+        if 8 <= len(digits) <= 15 and not YEAR_RANGE_RE.match(candidate):
+            return candidate
+    return None
+
+
+def extract_contact(raw_text, header=None):
+    """Email, phone and LinkedIn URL found by regex (None when not found).
+
+    The header (text above the first section) is searched first, since
+    referees' contact details tend to appear further down.
+    """
+    contact = {"email": None, "phone": None, "linkedin": None}
+    for text in ([header] if header else []) + [raw_text]:
+        if not contact["email"]:
+            match = EMAIL_RE.search(text)
+            contact["email"] = match.group() if match else None
+        if not contact["linkedin"]:
+            match = LINKEDIN_RE.search(text)
+            if match:
+                url = match.group().rstrip("/")
+                contact["linkedin"] = url if url.lower().startswith("http") else f"https://{url}"
+        if not contact["phone"]:
+            contact["phone"] = _find_phone(text)
+    return contact
+
+
+def preparse(raw_text):
+    """Contact fields and sections for one resume.
+
+    Returns {"contact": {...}, "header": str, "sections": {section: text}}.
+    """
+    header, sections = split_sections(raw_text)
+    return {
+        "contact": extract_contact(raw_text, header),
+        "header": header,
+        "sections": sections,
+    }
+
+
+def condensed_text(parsed):
+    """Resume text for the LLM: the header plus every useful section under a
+    canonical heading. Sections it doesn't need, and contact details that were
+    already found, are left out."""
+    header = parsed["header"]
+    for value in parsed["contact"].values():
+        if value:
+            header = header.replace(value, "")
+    if parsed["contact"]["linkedin"]:
+        header = LINKEDIN_RE.sub("", header)
+    # Drop the separators left behind ("Cairo |  | " -> "Cairo")
+    header = "\n".join(SEPARATOR_RUN_RE.sub(" | ", line).strip(" |")
+                       for line in header.splitlines() if re.search(r"\w", line))
+    parts = [header] if header else []
+    for name, text in parsed["sections"].items():
+        if name != "ignored" and text:
+            parts.append(f"## {name.title()}\n{text}")
+    return "\n\n".join(parts)
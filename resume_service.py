@@ -1,90 +1,254 @@
 import os
 import json
-from mistralai import Mistral
+import model_router
+import resume_preparse
 
-# Initialize Mistral client
-MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-if not MISTRAL_API_KEY:
-    raise ValueError("MISTRAL_API_KEY not found in environment variables")
+# Extract contact fields and sections locally and send the LLM a smaller prompt
+LOCAL_PREPARSE = os.environ.get("LOCAL_PREPARSE", "1") == "1"
+# Bump these whenever the matching prompt changes so cached results are not reused
+STRUCTURE_VERSION = f"{model_router.MODEL_TAG}:structure-v2" + ("" if LOCAL_PREPARSE else "-full")
+SCORE_VERSION = f"{model_router.MODEL_TAG}:score-v2"
+COMBINED_VERSION = f"{model_router.MODEL_TAG}:structure-score-v1" + ("" if LOCAL_PREPARSE else "-full")
 
-client = Mistral(api_key=MISTRAL_API_KEY)
+# Prompt registry: stage -> current version. Every cvs row stores the versions
+# its resume_data and score_data were produced with (structure_version,
+# score_version), so reprocess.py can find and re-run stale rows. Rows from
+# the combined prompt store COMBINED_VERSION for both.
+PROMPT_VERSIONS = {
+    "structure": STRUCTURE_VERSION,
+    "score": SCORE_VERSION,
+    "combined": COMBINED_VERSION,
+}
 
-def structure_resume_data(raw_text):
-    """Use Mistral LLM to structure the extracted text into JSON."""
-    structure_prompt = """Analyze the following resume/CV text and extract the information into a structured JSON format.
 
-Extract the following fields (use null if not found):
-- name: Full name of the candidate
-- email: Email address
-- phone: Phone number
-- location: City, Country or full address
-- linkedin: LinkedIn profile URL
-- summary: Professional summary or objective
-- experience: Array of work experiences, each with company, title, duration, location, responsibilities
-- education: Array of educational qualifications with institution, degree, field, duration, gpa
-- skills: Object with technical, soft, languages (programming), tools arrays
-- certifications: Array of certifications with name and date
-- languages: Array of spoken languages with proficiency
-- projects: Array of projects with name and description
+def stored_versions(mode):
+    """(structure_version, score_version) to store with results of a parse mode."""
+    if mode == "combined":
+        return COMBINED_VERSION, COMBINED_VERSION
+    return STRUCTURE_VERSION, SCORE_VERSION
 
-Resume Text:
-"""
-    
-    response = client.chat.complete(
-        model="mistral-large-latest",
-        messages=[{"role": "user", "content": structure_prompt + raw_text + "\n\nRespond ONLY with valid JSON."}],
-        response_format={"type": "json_object"}
-    )
-    
-    return json.loads(response.choices[0].message.content)
-
-def score_resume(resume_data, raw_text):
-    """Score the resume out of 100 with detailed breakdown."""
-    score_prompt = f"""Analyze this resume and provide a detailed score out of 100.
 
-Resume Data: {json.dumps(resume_data, indent=2)}
+def is_current(stage, version):
+    """Whether a stored structure/score version matches the current prompts."""
+    return version is not None and version in (PROMPT_VERSIONS[stage], COMBINED_VERSION)
+
+# Field name -> extraction instruction
+STRUCTURE_FIELDS = [
+    ("name", "Full name of the candidate"),
+    ("email", "Email address"),
+    ("phone", "Phone number"),
+    ("location", "City, Country or full address"),
+    ("linkedin", "LinkedIn profile URL"),
+    ("summary", "Professional summary or objective"),
+    ("experience", "Array of work experiences, each with company, title, duration, location, responsibilities"),
+    ("education", "Array of educational qualifications with institution, degree, field, duration, gpa"),
+    ("skills", "Object with technical, soft, languages (programming), tools arrays"),
+    ("certifications", "Array of certifications with name and date"),
+    ("languages", "Array of spoken languages with proficiency"),
+    ("projects", "Array of projects with name and description"),
+]
 
-Score the resume in these 4 categories (25 points each):
+SCORE_RUBRIC = """Score the resume in these 4 categories (25 points each):
 
 1. **Content Quality (0-25)**: Professional summary quality, quantified achievements, action verbs, metrics
 2. **Skills Relevance (0-25)**: Technical skills relevance, industry keywords, skill organization
 3. **Experience Clarity (0-25)**: Clear job descriptions, career progression, responsibilities clarity
-4. **Formatting & Structure (0-25)**: Completeness, organization, section balance
+4. **Formatting & Structure (0-25)**: Completeness, organization, section balance"""
 
-Respond with JSON in this exact format:
-{{
+SCORE_FORMAT = """{
     "total_score": <number 0-100>,
-    "categories": {{
-        "content_quality": {{
+    "categories": {
+        "content_quality": {
             "score": <0-25>,
             "feedback": "<specific feedback>"
-        }},
-        "skills_relevance": {{
+        },
+        "skills_relevance": {
             "score": <0-25>,
             "feedback": "<specific feedback>"
-        }},
-        "experience_clarity": {{
+        },
+        "experience_clarity": {
             "score": <0-25>,
             "feedback": "<specific feedback>"
-        }},
-        "formatting_structure": {{
+        },
+        "formatting_structure": {
             "score": <0-25>,
             "feedback": "<specific feedback>"
-        }}
-    }},
+        }
+    },
     "strengths": ["<strength 1>", "<strength 2>", "<strength 3>"],
     "improvements": [
-        {{"issue": "<issue>", "suggestion": "<how to fix>"}},
-        {{"issue": "<issue>", "suggestion": "<how to fix>"}},
-        {{"issue": "<issue>", "suggestion": "<how to fix>"}}
+        {"issue": "<issue>", "suggestion": "<how to fix>"},
+        {"issue": "<issue>", "suggestion": "<how to fix>"},
+        {"issue": "<issue>", "suggestion": "<how to fix>"}
     ],
     "overall_feedback": "<2-3 sentence overall assessment>"
-}}"""
-
-    response = client.chat.complete(
-        model="mistral-large-latest",
-        messages=[{"role": "user", "content": score_prompt}],
-        response_format={"type": "json_object"}
-    )
-    
-    return json.loads(response.choices[0].message.content)
+}"""
+
+SCORE_CATEGORIES = ("content_quality", "skills_relevance", "experience_clarity", "formatting_structure")
+
+def _prompt_input(raw_text):
+    """Return (field list, resume text, known fields) for a structuring prompt.
+
+    With LOCAL_PREPARSE, contact fields found by regex are left out of the
+    field list and the text is cut down to its useful sections.
+    """
+    known = {}
+    resume_text = raw_text
+    if LOCAL_PREPARSE:
+        parsed = resume_preparse.preparse(raw_text)
+        known = {field: value for field, value in parsed["contact"].items() if value}
+        resume_text = resume_preparse.condensed_text(parsed) or raw_text
+
+    fields = "\n".join(f"- {name}: {description}" for name, description in STRUCTURE_FIELDS
+                       if name not in known)
+    return fields, resume_text, known
+
+def build_structure_prompt(raw_text):
+    """Return (prompt, known fields) for structuring a resume."""
+    fields, resume_text, known = _prompt_input(raw_text)
+    prompt = f"""Analyze the following resume/CV text and extract the information into a structured JSON format.
+
+Extract the following fields (use null if not found):
+{fields}
+
+Resume Text:
+{resume_text}
+
+Respond ONLY with valid JSON."""
+    return prompt, known
+
+def build_combined_prompt(raw_text):
+    """Return (prompt, known fields) for structuring and scoring in one completion."""
+    fields, resume_text, known = _prompt_input(raw_text)
+    prompt = f"""Analyze the following resume/CV text. Extract its information into a structured JSON format and score it out of 100.
+
+Extract the following fields (use null if not found):
+{fields}
+- score_data: The resume's score, as described below
+
+{SCORE_RUBRIC}
+
+score_data must be in this exact format:
+{SCORE_FORMAT}
+
+Resume Text:
+{resume_text}
+
+Respond ONLY with valid JSON holding the extracted fields, with score_data last."""
+    return prompt, known
+
+def _with_known(on_partial, known):
+    """Wrap on_partial so locally extracted fields are always included, and
+    send them right away: they are available before the first token."""
+    if on_partial is None or not known:
+        return on_partial
+    on_partial(dict(known))
+    return lambda fields: on_partial({**known, **fields})
+
+def validate_resume_data(resume_data):
+    """Raise ValueError unless resume_data has the expected shape."""
+    if not isinstance(resume_data, dict):
+        raise ValueError("resume data is not an object")
+    for field in ("name", "email", "phone", "location", "linkedin", "summary"):
+        if not isinstance(resume_data.get(field), (str, type(None))):
+            raise ValueError(f"{field} is not a string")
+    for field in ("experience", "education", "certifications", "languages", "projects"):
+        if not isinstance(resume_data.get(field), (list, type(None))):
+            raise ValueError(f"{field} is not an array")
+    if not isinstance(resume_data.get("skills"), (dict, list, type(None))):
+        raise ValueError("skills is not an object")
+
+def validate_score_data(score_data):
+    """Raise ValueError unless score_data matches SCORE_FORMAT."""
+    if not isinstance(score_data, dict):
+        raise ValueError("score data is not an object")
+    total = score_data.get("total_score")
+    if isinstance(total, bool) or not isinstance(total, (int, float)) or not 0 <= total <= 100:
+        raise ValueError("total_score is not a number from 0 to 100")
+    categories = score_data.get("categories")
+    if not isinstance(categories, dict):
+        raise ValueError("categories is not an object")
+    for name in SCORE_CATEGORIES:
+        category = categories.get(name)
+        score = category.get("score") if isinstance(category, dict) else None
+        if isinstance(score, bool) or not isinstance(score, (int, float)) or not 0 <= score <= 25:
+            raise ValueError(f"categories.{name}.score is not a number from 0 to 25")
+    for field in ("strengths", "improvements"):
+        if not isinstance(score_data.get(field), list):
+            raise ValueError(f"{field} is not an array")
+
+def check_structure_confidence(resume_data, raw_text):
+    """Raise ValueError when the extraction missed content the text clearly has:
+    a name in the header, or entries under an experience/education heading."""
+    header, sections = resume_preparse.split_sections(raw_text)
+    if header and not resume_data.get("name"):
+        raise ValueError("no name extracted")
+    for section in ("experience", "education"):
+        if sections.get(section) and not resume_data.get(section):
+            raise ValueError(f"{section} section present but nothing extracted")
+
+def structure_resume_data(raw_text, on_partial=None):
+    """Use Mistral LLM to structure the extracted text into JSON."""
+    prompt, known = build_structure_prompt(raw_text)
+
+    def validate(resume_data):
+        validate_resume_data(resume_data)
+        check_structure_confidence(resume_data, raw_text)
+
+    resume_data = model_router.complete_json("structure", prompt, validate, _with_known(on_partial, known))
+    resume_data.update(known)
+    return resume_data
+
+def score_resume(resume_data, raw_text, on_partial=None):
+    """Score the resume out of 100 with detailed breakdown."""
+    # Compact JSON: indentation only costs input tokens
+    score_prompt = f"""Analyze this resume and provide a detailed score out of 100.
+
+Resume Data: {json.dumps(resume_data, ensure_ascii=False, separators=(",", ":"))}
+
+{SCORE_RUBRIC}
+
+Respond with JSON in this exact format:
+{SCORE_FORMAT}"""
+
+    return model_router.complete_json("score", score_prompt, validate_score_data, on_partial)
+
+def structure_and_score_resume(raw_text, on_partial=None, on_score=None):
+    """Structure and score a resume in a single completion.
+
+    Returns (resume_data, score_data). on_partial receives partial resume
+    fields as they stream in and on_score the score once it arrives. If the
+    combined output is malformed or fails validation, falls back to
+    structure_resume_data + score_resume.
+    """
+    prompt, known = build_combined_prompt(raw_text)
+    streaming = on_partial is not None or on_score is not None
+    resume_partial = _with_known(on_partial, known)
+
+    def split_partial(fields):
+        fields = dict(fields)
+        score_data = fields.pop("score_data", None)
+        if resume_partial and fields:
+            resume_partial(fields)
+        if on_score and score_data is not None:
+            on_score(score_data)
+
+    def validate(combined):
+        if not isinstance(combined, dict):
+            raise ValueError("response is not an object")
+        resume_data = {k: v for k, v in combined.items() if k != "score_data"}
+        validate_resume_data(resume_data)
+        check_structure_confidence(resume_data, raw_text)
+        validate_score_data(combined.get("score_data"))
+
+    try:
+        combined = model_router.complete_json("structure_score", prompt, validate,
+                                              split_partial if streaming else None, strict=True)
+        score_data = combined.pop("score_data")
+        combined.update(known)
+        return combined, score_data
+    except ValueError as e:
+        print(f"Combined structure+score output rejected ({e}); falling back to two calls")
+
+    resume_data = structure_resume_data(raw_text, on_partial)
+    return resume_data, score_resume(resume_data, raw_text, on_score)
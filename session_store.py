@@ -0,0 +1,204 @@
+import os
+import json
+import time
+import zlib
+import base64
+import sqlite3
+import tempfile
+import threading
+from collections import OrderedDict
+
+# Short-lived per-session state (parsed resumes, quizzes, assessments).
+# "sqlite" is shared by every gunicorn worker on the host; "memory" is per process.
+SESSION_BACKEND = os.environ.get("SESSION_BACKEND", "sqlite")
+SESSION_DB_PATH = os.environ.get("SESSION_DB_PATH", os.path.join(tempfile.gettempdir(), "resume_sessions.sqlite3"))
+SESSION_TTL_SECONDS = int(os.environ.get("SESSION_TTL_SECONDS", "3600"))
+SESSION_MAX_ENTRIES = int(os.environ.get("SESSION_MAX_ENTRIES", "10000"))
+# Internal entries (job snapshots, prefetched quizzes, signed URLs, batch
+# checkpoints) are kept in their own namespaces, apart from user sessions;
+# this caps each namespace
+SESSION_NAMESPACE_MAX_ENTRIES = int(os.environ.get("SESSION_NAMESPACE_MAX_ENTRIES", "10000"))
+
+# Payloads above this size are zlib-compressed (raw OCR text dominates them)
+_COMPRESS_THRESHOLD = 1024
+_RAW = b"j"
+_ZLIB = b"z"
+
+
+def encode(value):
+    """Serialize a session value to compact JSON bytes, compressing large payloads."""
+    data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    if len(data) > _COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(data, 6)
+    return _RAW + data
+
+
+def decode(blob):
+    """Inverse of encode()."""
+    blob = bytes(blob)
+    data = zlib.decompress(blob[1:]) if blob[:1] == _ZLIB else blob[1:]
+    return json.loads(data.decode("utf-8"))
+
+
+class MemoryBackend:
+    """Per-process store with TTL and least-recently-used eviction."""
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+            if not item:
+                return None
+            expires_at, blob = item
+            if expires_at <= time.time():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+        return decode(blob)
+
+    def set(self, key, value):
+        blob = encode(value)
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (time.time() + self.ttl, blob)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._items.pop(key, None)
+
+
+class SQLiteBackend:
+    """Store in a local SQLite file so every worker process sees the same sessions."""
+
+    def __init__(self, path, ttl, max_entries, table="sessions"):
+        if not table.isidentifier():
+            raise ValueError(f"Invalid session table name: {table}")
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.table = table
+        self._local = threading.local()
+        conn = self._conn()
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS {table} ("
+            " key TEXT PRIMARY KEY,"
+            " data BLOB NOT NULL,"
+            " expires_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL)"
+        )
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_expires_idx ON {table} (expires_at)")
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {table}_accessed_idx ON {table} (accessed_at)")
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        now = time.time()
+        conn = self._conn()
+        row = conn.execute(
+            f"SELECT data FROM {self.table} WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        if not row:
+            return None
+        conn.execute(f"UPDATE {self.table} SET accessed_at = ? WHERE key = ?", (now, key))
+        return decode(row[0])
+
+    def set(self, key, value):
+        now = time.time()
+        conn = self._conn()
+        conn.execute(
+            f"INSERT OR REPLACE INTO {self.table} (key, data, expires_at, accessed_at) VALUES (?, ?, ?, ?)",
+            (key, sqlite3.Binary(encode(value)), now + self.ttl, now),
+        )
+        self._evict(conn, now)
+
+    def delete(self, key):
+        self._conn().execute(f"DELETE FROM {self.table} WHERE key = ?", (key,))
+
+    def _evict(self, conn, now):
+        conn.execute(f"DELETE FROM {self.table} WHERE expires_at <= ?", (now,))
+        (count,) = conn.execute(f"SELECT COUNT(*) FROM {self.table}").fetchone()
+        if count > self.max_entries:
+            conn.execute(
+                f"DELETE FROM {self.table} WHERE key IN "
+                f"(SELECT key FROM {self.table} ORDER BY accessed_at LIMIT ?)",
+                (count - self.max_entries,),
+            )
+
+
+def _make_backend(max_entries=SESSION_MAX_ENTRIES, table="sessions"):
+    if SESSION_BACKEND == "memory":
+        return MemoryBackend(SESSION_TTL_SECONDS, max_entries)
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteBackend(SESSION_DB_PATH, SESSION_TTL_SECONDS, max_entries, table)
+    raise ValueError(f"Unknown SESSION_BACKEND: {SESSION_BACKEND}")
+
+
+_backend = _make_backend()
+
+
+class Namespace:
+    """Internal entries kept apart from user sessions: their own table (or
+    dict) and their own LRU limit, so they can't collide with or evict them."""
+
+    def __init__(self, name, max_entries=SESSION_NAMESPACE_MAX_ENTRIES):
+        self.name = name
+        self._backend = _make_backend(max_entries, f"ns_{name}")
+
+    def get(self, key):
+        return self._backend.get(key)
+
+    def put(self, key, value):
+        self._backend.set(key, value)
+
+    def delete(self, key):
+        self._backend.delete(key)
+
+
+def new_session_id():
+    """Random, URL-safe session id."""
+    return base64.urlsafe_b64encode(os.urandom(16)).decode("ascii").rstrip("=")
+
+
+def valid_session_id(session_id):
+    """True if a client-supplied id could have come from new_session_id()."""
+    return isinstance(session_id, str) and 0 < len(session_id) <= 64 and ":" not in session_id
+
+
+def get(session_id):
+    """Return the session dict, or None if it is unknown or expired."""
+    if not session_id:
+        return None
+    return _backend.get(session_id)
+
+
+def put(session_id, value):
+    """Store (replace) a session dict; resets its TTL."""
+    _backend.set(session_id, value)
+
+
+def update(session_id, **fields):
+    """Merge fields into an existing session. Returns the new value, or None if missing."""
+    value = get(session_id)
+    if value is None:
+        return None
+    value.update(fields)
+    put(session_id, value)
+    return value
+
+
+def delete(session_id):
+    _backend.delete(session_id)
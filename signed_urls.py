@@ -0,0 +1,44 @@
+import os
+import time
+import session_store
+
+# Signed download URLs for stored PDFs, cached per storage path in the shared
+# session store and reissued shortly before they expire.
+SIGNED_URL_EXPIRES_SECONDS = int(os.environ.get("SIGNED_URL_EXPIRES_SECONDS", "3600"))
+# Hand out a cached URL only if it stays valid at least this long
+SIGNED_URL_MIN_REMAINING_SECONDS = int(os.environ.get("SIGNED_URL_MIN_REMAINING_SECONDS", "300"))
+BUCKET = 'resumes'
+
+_store = session_store.Namespace("signed_urls")
+
+
+def _store_key(file_path):
+    return f"{BUCKET}:{file_path}"
+
+
+def get(client, file_path):
+    """A signed URL for a file in the resumes bucket, or None on failure.
+
+    The caller must already have checked the user may read this file (e.g. by
+    selecting its cvs row), since cached URLs are shared between requests.
+    """
+    key = _store_key(file_path)
+    cached = _store.get(key)
+    if cached and cached.get("expires_at", 0) - time.time() > SIGNED_URL_MIN_REMAINING_SECONDS:
+        return cached["url"]
+
+    issued_at = time.time()
+    try:
+        url_response = client.storage.from_(BUCKET).create_signed_url(file_path, SIGNED_URL_EXPIRES_SECONDS)
+    except Exception as e:
+        print(f"Error generating signed URL: {e}")
+        return None
+    url = url_response.get('signedURL') or url_response.get('signedUrl')
+    if url:
+        _store.put(key, {"url": url, "expires_at": issued_at + SIGNED_URL_EXPIRES_SECONDS})
+    return url
+
+
+def forget(file_path):
+    """Drop the cached URL for a file that was deleted."""
+    _store.delete(_store_key(file_path))
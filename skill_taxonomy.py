@@ -0,0 +1,227 @@
+"""Canonical skill taxonomy.
+
+Maps free-text skill names ("JS", "ReactJS", "Python 3") to the integer ids
+of the skill_taxonomy table, using the aliases in skill_aliases. Ids are
+assigned when skills and CVs are written (skills.canonical_skill_id,
+cvs.skill_ids), so candidate search filters by intersecting integer sets
+instead of comparing strings.
+
+Names that aren't an exact alias are scanned with an Aho-Corasick automaton
+over the aliases, so "Advanced Python 3 programming" still maps to Python.
+Aliases of EXACT_ONLY_MAX_CHARS characters or fewer, and those flagged
+exact_only ("go", "spring", "rest"), are left out of the scan, since they
+also occur in names like "Objective-C" or "Spring semester internship".
+The aliases are loaded lazily and reloaded every TAXONOMY_REFRESH_SECONDS.
+"""
+import os
+import time
+import threading
+from collections import deque
+from supabase import create_client
+
+SUPABASE_URL = os.environ.get("SUPABASE_URL")
+SUPABASE_ANON_KEY = os.environ.get("SUPABASE_ANON_KEY")
+
+TAXONOMY_REFRESH_SECONDS = int(os.environ.get("TAXONOMY_REFRESH_SECONDS", "3600"))
+# After a failed load, try again this much sooner than a normal refresh
+_RETRY_SECONDS = 60
+# Aliases this short only match a skill name that is exactly the alias
+EXACT_ONLY_MAX_CHARS = 2
+_PAGE_SIZE = 1000
+_STRIP = " \t.,;:!?-_/\\|()[]{}'\"*"
+
+_client = create_client(SUPABASE_URL, SUPABASE_ANON_KEY) if SUPABASE_URL and SUPABASE_ANON_KEY else None
+_lock = threading.Lock()
+_matcher = None
+_next_load = 0.0
+
+
+def normalize(name):
+    """Alias form of a skill name: lowercase, single spaces, no surrounding
+    punctuation ("  ReactJS. " -> "reactjs"). Keeps "+", "#" and inner dots."""
+    return " ".join(str(name).lower().split()).strip(_STRIP)
+
+
+def _is_word_char(ch):
+    return ch.isalnum()
+
+
+class Matcher:
+    """Aho-Corasick automaton over normalized aliases.
+
+    `find(text)` returns the alias matches in one pass over the text, whole
+    words only, longest first where matches overlap. Aliases in `exact_only`,
+    or of EXACT_ONLY_MAX_CHARS characters or fewer, are only used for exact
+    lookups, never found inside longer text.
+    """
+
+    def __init__(self, aliases, exact_only=()):
+        exact_only = {normalize(alias) for alias in exact_only}
+        self.aliases = {}
+        self._goto = [{}]
+        self._fail = [0]
+        self._out = [[]]  # node -> [(alias length, skill id)]
+        for alias, skill_id in aliases.items():
+            alias = normalize(alias)
+            if not alias:
+                continue
+            self.aliases[alias] = skill_id
+            if len(alias) > EXACT_ONLY_MAX_CHARS and alias not in exact_only:
+                self._add(alias, skill_id)
+        self._link()
+
+    def _add(self, alias, skill_id):
+        node = 0
+        for ch in alias:
+            nxt = self._goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[node][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            node = nxt
+        self._out[node].append((len(alias), skill_id))
+
+    def _link(self):
+        """Breadth-first pass setting failure links and merging outputs."""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                target = self._goto[fail].get(ch, 0)
+                self._fail[child] = target if target != child else 0
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+                queue.append(child)
+
+    def find(self, text):
+        """Non-overlapping (start, end, skill id) matches in normalized text."""
+        text = normalize(text)
+        matches = []
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in self._goto[node]:
+                node = self._fail[node]
+            node = self._goto[node].get(ch, 0)
+            for length, skill_id in self._out[node]:
+                start, end = i - length + 1, i + 1
+                if start > 0 and _is_word_char(text[start - 1]) and _is_word_char(text[start]):
+                    continue
+                if end < len(text) and _is_word_char(text[end]) and _is_word_char(text[end - 1]):
+                    continue
+                matches.append((start, end, skill_id))
+
+        # Greedy: leftmost, then longest, skipping anything overlapping a kept match
+        matches.sort(key=lambda m: (m[0], m[0] - m[1]))
+        kept = []
+        for match in matches:
+            if not kept or match[0] >= kept[-1][1]:
+                kept.append(match)
+        return kept
+
+    def canonical_id(self, name):
+        """Id for one skill name: an exact alias, else its longest alias match."""
+        key = normalize(name)
+        if key in self.aliases:
+            return self.aliases[key]
+        matches = self.find(key)
+        if not matches:
+            return None
+        return max(matches, key=lambda m: m[1] - m[0])[2]
+
+    def ids(self, text):
+        """Every skill id mentioned in text ("Python/Django, SQL" -> three ids)."""
+        key = normalize(text)
+        if key in self.aliases:
+            return {self.aliases[key]}
+        return {skill_id for _, _, skill_id in self.find(key)}
+
+
+def _load_aliases():
+    """(alias -> skill id, set of exact_only aliases) from skill_aliases."""
+    aliases = {}
+    exact_only = set()
+    start = 0
+    while True:
+        result = _client.table('skill_aliases').select('alias, skill_id, exact_only').range(
+            start, start + _PAGE_SIZE - 1).execute()
+        rows = result.data or []
+        for row in rows:
+            aliases[row['alias']] = row['skill_id']
+            if row.get('exact_only'):
+                exact_only.add(row['alias'])
+        if len(rows) < _PAGE_SIZE:
+            return aliases, exact_only
+        start += _PAGE_SIZE
+
+
+def matcher():
+    """The current Matcher, (re)loading the aliases when they're due."""
+    global _matcher, _next_load
+    if _client is None:
+        return _matcher or Matcher({})
+    with _lock:
+        if time.time() >= _next_load:
+            try:
+                _matcher = Matcher(*_load_aliases())
+                _next_load = time.time() + TAXONOMY_REFRESH_SECONDS
+            except Exception as e:
+                print(f"Skill taxonomy load error: {e}")
+                _next_load = time.time() + _RETRY_SECONDS
+        return _matcher or Matcher({})
+
+
+def canonical_id(skill_name):
+    """Canonical id for a skills.skill_name, or None if the taxonomy doesn't know it."""
+    return matcher().canonical_id(skill_name)
+
+
+def skill_names(skills):
+    """Skill strings from resume_data["skills"]: a list, or a dict of category lists.
+    List items may be strings or objects with a "name"."""
+    if isinstance(skills, dict):
+        for value in skills.values():
+            yield from skill_names(value)
+    elif isinstance(skills, list):
+        for item in skills:
+            if isinstance(item, dict):
+                item = item.get("name") or item.get("skill")
+            if isinstance(item, str):
+                yield item
+    elif isinstance(skills, str):
+        yield skills
+
+
+def resume_skill_ids(resume_data):
+    """Sorted canonical ids of every skill listed in resume_data["skills"]."""
+    if not isinstance(resume_data, dict):
+        return []
+    current = matcher()
+    ids = set()
+    for name in skill_names(resume_data.get("skills")):
+        ids |= current.ids(name)
+    return sorted(ids)
+
+
+def split_filter(skill_names):
+    """Split search filter names into (canonical ids, names without an exact alias)."""
+    current = matcher()
+    ids, unmapped = set(), []
+    for name in skill_names:
+        key = normalize(name)
+        if key in current.aliases:
+            ids.add(current.aliases[key])
+        elif key:
+            unmapped.append(key)
+    return sorted(ids), unmapped
+
+
+def stats():
+    current = _matcher
+    return {
+        "aliases": len(current.aliases) if current else 0,
+        "skills": len(set(current.aliases.values())) if current else 0
+    }
@@ -3,6 +3,10 @@
 -- Run this SQL in your Supabase SQL Editor
 -- =============================================
 
+-- Extensions used by the search indexes below (trigram matching, integer arrays)
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+CREATE EXTENSION IF NOT EXISTS intarray;
+
 -- 1. Create user_roles table
 CREATE TABLE IF NOT EXISTS user_roles (
     user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE PRIMARY KEY,
@@ -84,6 +88,333 @@ BEGIN
     END IF;
 END $$;
 
+-- 7. Indexes for per-user lookups
+CREATE INDEX IF NOT EXISTS skills_user_id_idx ON skills (user_id);
+
+-- 8. Canonical skill taxonomy. Aliases ("js", "javascript", "java script") map to
+-- one integer id; the app assigns ids at write time (skills.canonical_skill_id,
+-- cvs.skill_ids) so candidate search can intersect integer sets. Short or
+-- ambiguous aliases ("c", "go", "spring") are exact_only: they map a skill name
+-- that is exactly the alias, but are never looked for inside longer names.
+CREATE TABLE IF NOT EXISTS skill_taxonomy (
+    id SERIAL PRIMARY KEY,
+    canonical_name TEXT UNIQUE NOT NULL,
+    skill_type TEXT CHECK (skill_type IN ('soft', 'technical')) NOT NULL DEFAULT 'technical'
+);
+
+CREATE TABLE IF NOT EXISTS skill_aliases (
+    alias TEXT PRIMARY KEY,  -- normalized: lowercase, single spaces
+    skill_id INTEGER REFERENCES skill_taxonomy(id) ON DELETE CASCADE NOT NULL,
+    exact_only BOOLEAN NOT NULL DEFAULT FALSE
+);
+
+ALTER TABLE skill_aliases ADD COLUMN IF NOT EXISTS exact_only BOOLEAN NOT NULL DEFAULT FALSE;
+
+CREATE INDEX IF NOT EXISTS skill_aliases_skill_id_idx ON skill_aliases (skill_id);
+
+INSERT INTO skill_taxonomy (canonical_name, skill_type) VALUES
+    ('JavaScript', 'technical'), ('TypeScript', 'technical'), ('Python', 'technical'),
+    ('Java', 'technical'), ('C', 'technical'), ('C++', 'technical'), ('C#', 'technical'),
+    ('Go', 'technical'), ('Rust', 'technical'), ('PHP', 'technical'), ('Ruby', 'technical'),
+    ('Kotlin', 'technical'), ('Swift', 'technical'), ('R', 'technical'), ('SQL', 'technical'),
+    ('PostgreSQL', 'technical'), ('MySQL', 'technical'), ('MongoDB', 'technical'),
+    ('HTML', 'technical'), ('CSS', 'technical'), ('React', 'technical'), ('Angular', 'technical'),
+    ('Vue.js', 'technical'), ('Node.js', 'technical'), ('Django', 'technical'), ('Flask', 'technical'),
+    ('Spring', 'technical'), ('.NET', 'technical'), ('Docker', 'technical'), ('Kubernetes', 'technical'),
+    ('AWS', 'technical'), ('Microsoft Azure', 'technical'), ('Google Cloud', 'technical'),
+    ('Git', 'technical'), ('Linux', 'technical'), ('Machine Learning', 'technical'),
+    ('Deep Learning', 'technical'), ('Natural Language Processing', 'technical'),
+    ('Computer Vision', 'technical'), ('Data Analysis', 'technical'), ('Pandas', 'technical'),
+    ('NumPy', 'technical'), ('TensorFlow', 'technical'), ('PyTorch', 'technical'),
+    ('Power BI', 'technical'), ('Tableau', 'technical'), ('Microsoft Excel', 'technical'),
+    ('Figma', 'technical'), ('REST APIs', 'technical'), ('GraphQL', 'technical'),
+    ('Communication', 'soft'), ('Teamwork', 'soft'), ('Leadership', 'soft'),
+    ('Problem Solving', 'soft'), ('Time Management', 'soft'), ('Critical Thinking', 'soft'),
+    ('Project Management', 'soft'), ('Adaptability', 'soft'), ('Creativity', 'soft')
+ON CONFLICT (canonical_name) DO NOTHING;
+
+-- Every canonical name is an alias of itself
+INSERT INTO skill_aliases (alias, skill_id)
+SELECT lower(canonical_name), id FROM skill_taxonomy
+ON CONFLICT (alias) DO NOTHING;
+
+INSERT INTO skill_aliases (alias, skill_id)
+SELECT a.alias, t.id
+FROM (VALUES
+    ('js', 'JavaScript'), ('java script', 'JavaScript'), ('ecmascript', 'JavaScript'), ('es6', 'JavaScript'),
+    ('ts', 'TypeScript'), ('py', 'Python'), ('python3', 'Python'), ('python 3', 'Python'),
+    ('cpp', 'C++'), ('c plus plus', 'C++'), ('c sharp', 'C#'), ('csharp', 'C#'), ('golang', 'Go'),
+    ('postgres', 'PostgreSQL'), ('postgresql', 'PostgreSQL'), ('mongo', 'MongoDB'),
+    ('html5', 'HTML'), ('css3', 'CSS'), ('reactjs', 'React'), ('react.js', 'React'),
+    ('angularjs', 'Angular'), ('vue', 'Vue.js'), ('vuejs', 'Vue.js'), ('node', 'Node.js'),
+    ('nodejs', 'Node.js'), ('spring boot', 'Spring'), ('dotnet', '.NET'), ('asp.net', '.NET'),
+    ('k8s', 'Kubernetes'), ('amazon web services', 'AWS'), ('azure', 'Microsoft Azure'),
+    ('gcp', 'Google Cloud'), ('google cloud platform', 'Google Cloud'), ('github', 'Git'),
+    ('ml', 'Machine Learning'), ('dl', 'Deep Learning'), ('nlp', 'Natural Language Processing'),
+    ('data analytics', 'Data Analysis'), ('excel', 'Microsoft Excel'), ('ms excel', 'Microsoft Excel'),
+    ('powerbi', 'Power BI'), ('rest', 'REST APIs'), ('rest api', 'REST APIs'), ('restful apis', 'REST APIs'),
+    ('team work', 'Teamwork'), ('collaboration', 'Teamwork'), ('communication skills', 'Communication'),
+    ('problem-solving', 'Problem Solving'), ('problem solving skills', 'Problem Solving')
+) AS a(alias, canonical_name)
+JOIN skill_taxonomy t ON t.canonical_name = a.canonical_name
+ON CONFLICT (alias) DO NOTHING;
+
+-- Aliases that are also ordinary words, or short enough to appear inside other
+-- words ("Objective-C", "R&D", "Go-getter"); aliases of 1-2 characters are
+-- treated as exact_only by the app regardless
+UPDATE skill_aliases SET exact_only = TRUE
+WHERE alias IN ('c', 'r', 'go', 'spring', 'rest', 'node', 'swift', 'rust', 'ruby', 'excel');
+
+ALTER TABLE skills ADD COLUMN IF NOT EXISTS canonical_skill_id INTEGER REFERENCES skill_taxonomy(id) ON DELETE SET NULL;
+ALTER TABLE cvs ADD COLUMN IF NOT EXISTS skill_ids INTEGER[] NOT NULL DEFAULT '{}';
+DROP INDEX IF EXISTS cvs_skill_ids_idx;  -- cvs.skill_ids is only read per user, into candidate_search
+
+-- Backfill exact alias matches for skills added before the taxonomy existed
+UPDATE skills s SET canonical_skill_id = a.skill_id
+FROM skill_aliases a
+WHERE s.canonical_skill_id IS NULL
+  AND a.alias = lower(regexp_replace(trim(s.skill_name), '\s+', ' ', 'g'));
+
+-- 9. Candidate search index: one denormalized row per candidate, kept up to date by triggers
+CREATE TABLE IF NOT EXISTS candidate_search (
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE PRIMARY KEY,
+    full_name TEXT,
+    professional_headline TEXT,
+    location TEXT,
+    major_specialization TEXT,
+    graduation_year INTEGER,
+    years_of_experience TEXT,
+    skill_names TEXT[] NOT NULL DEFAULT '{}',      -- lower(trim(skill_name))
+    skill_ids INTEGER[] NOT NULL DEFAULT '{}',     -- canonical ids from skills and the candidate's CVs
+    verified_avg_score INTEGER NOT NULL DEFAULT 0,
+    top_skills JSONB NOT NULL DEFAULT '[]'::jsonb,
+    updated_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+ALTER TABLE candidate_search ADD COLUMN IF NOT EXISTS skill_ids INTEGER[] NOT NULL DEFAULT '{}';
+
+CREATE INDEX IF NOT EXISTS candidate_search_skill_names_idx ON candidate_search USING GIN (skill_names);
+CREATE INDEX IF NOT EXISTS candidate_search_skill_ids_idx ON candidate_search USING GIN (skill_ids gin__int_ops);
+CREATE INDEX IF NOT EXISTS candidate_search_major_trgm_idx ON candidate_search USING GIN (major_specialization gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS candidate_search_location_trgm_idx ON candidate_search USING GIN (location gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS candidate_search_graduation_year_idx ON candidate_search (graduation_year);
+CREATE INDEX IF NOT EXISTS candidate_search_ranking_idx ON candidate_search (verified_avg_score DESC, user_id);
+
+-- Rebuild the search row for one candidate
+CREATE OR REPLACE FUNCTION refresh_candidate_search(p_user_id UUID)
+RETURNS VOID
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public
+AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM candidate_profiles WHERE user_id = p_user_id) THEN
+        DELETE FROM candidate_search WHERE user_id = p_user_id;
+        RETURN;
+    END IF;
+
+    INSERT INTO candidate_search (
+        user_id, full_name, professional_headline, location, major_specialization,
+        graduation_year, years_of_experience, skill_names, skill_ids, verified_avg_score, top_skills, updated_at
+    )
+    SELECT
+        cp.user_id, cp.full_name, cp.professional_headline, cp.location, cp.major_specialization,
+        cp.graduation_year, cp.years_of_experience,
+        COALESCE((SELECT array_agg(DISTINCT lower(trim(s.skill_name))) FROM skills s WHERE s.user_id = cp.user_id), '{}'),
+        COALESCE((SELECT sort(array_agg(DISTINCT ids.id)) FROM (
+            SELECT s.canonical_skill_id AS id FROM skills s
+            WHERE s.user_id = cp.user_id AND s.canonical_skill_id IS NOT NULL
+            UNION
+            SELECT unnest(c.skill_ids) FROM cvs c WHERE c.user_id = cp.user_id
+        ) ids), '{}'),
+        COALESCE((SELECT FLOOR(AVG(s.score))::INTEGER FROM skills s WHERE s.user_id = cp.user_id AND s.is_verified), 0),
+        COALESCE((SELECT jsonb_agg(to_jsonb(t)) FROM (
+            SELECT * FROM skills s WHERE s.user_id = cp.user_id LIMIT 5
+        ) t), '[]'::jsonb),
+        NOW()
+    FROM candidate_profiles cp
+    WHERE cp.user_id = p_user_id
+    ON CONFLICT (user_id) DO UPDATE SET
+        full_name = EXCLUDED.full_name,
+        professional_headline = EXCLUDED.professional_headline,
+        location = EXCLUDED.location,
+        major_specialization = EXCLUDED.major_specialization,
+        graduation_year = EXCLUDED.graduation_year,
+        years_of_experience = EXCLUDED.years_of_experience,
+        skill_names = EXCLUDED.skill_names,
+        skill_ids = EXCLUDED.skill_ids,
+        verified_avg_score = EXCLUDED.verified_avg_score,
+        top_skills = EXCLUDED.top_skills,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$;
+
+CREATE OR REPLACE FUNCTION candidate_search_sync()
+RETURNS TRIGGER
+LANGUAGE plpgsql SECURITY DEFINER SET search_path = public
+AS $$
+BEGIN
+    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+        PERFORM refresh_candidate_search(OLD.user_id);
+    END IF;
+    IF TG_OP IN ('INSERT', 'UPDATE') AND (TG_OP = 'INSERT' OR NEW.user_id IS DISTINCT FROM OLD.user_id) THEN
+        PERFORM refresh_candidate_search(NEW.user_id);
+    END IF;
+    RETURN NULL;
+END;
+$$;
+
+DROP TRIGGER IF EXISTS candidate_profiles_search_sync ON candidate_profiles;
+CREATE TRIGGER candidate_profiles_search_sync
+    AFTER INSERT OR UPDATE OR DELETE ON candidate_profiles
+    FOR EACH ROW EXECUTE FUNCTION candidate_search_sync();
+
+DROP TRIGGER IF EXISTS skills_search_sync ON skills;
+CREATE TRIGGER skills_search_sync
+    AFTER INSERT OR UPDATE OR DELETE ON skills
+    FOR EACH ROW EXECUTE FUNCTION candidate_search_sync();
+
+DROP TRIGGER IF EXISTS cvs_search_sync ON cvs;
+CREATE TRIGGER cvs_search_sync
+    AFTER INSERT OR UPDATE OF skill_ids, user_id OR DELETE ON cvs
+    FOR EACH ROW EXECUTE FUNCTION candidate_search_sync();
+
+-- Backfill existing candidates
+SELECT refresh_candidate_search(user_id) FROM candidate_profiles;
+
+-- Ranked, keyset-paginated search over candidate_search (called from /api/candidates).
+-- Requested skills arrive as canonical ids (p_skill_ids) plus any names the taxonomy
+-- doesn't know (p_skills). Relevance = number of requested skills the candidate has;
+-- ties break on verified score, then user_id. Pass the last row's
+-- (relevance, score, user_id) as the cursor.
+DROP FUNCTION IF EXISTS search_candidates(TEXT, TEXT, INTEGER, TEXT, TEXT[], INTEGER);
+DROP FUNCTION IF EXISTS search_candidates(TEXT, TEXT, INTEGER, TEXT, TEXT[], INTEGER, INTEGER, INTEGER, INTEGER, UUID);
+CREATE OR REPLACE FUNCTION search_candidates(
+    p_major TEXT DEFAULT NULL,
+    p_location TEXT DEFAULT NULL,
+    p_graduation_year INTEGER DEFAULT NULL,
+    p_experience TEXT DEFAULT NULL,
+    p_skills TEXT[] DEFAULT NULL,
+    p_min_skill_score INTEGER DEFAULT 0,
+    p_limit INTEGER DEFAULT 20,
+    p_cursor_relevance INTEGER DEFAULT NULL,
+    p_cursor_score INTEGER DEFAULT NULL,
+    p_cursor_user_id UUID DEFAULT NULL,
+    p_skill_ids INTEGER[] DEFAULT NULL
+)
+RETURNS TABLE (
+    user_id UUID,
+    full_name TEXT,
+    professional_headline TEXT,
+    location TEXT,
+    major_specialization TEXT,
+    graduation_year INTEGER,
+    years_of_experience TEXT,
+    skills JSONB,
+    average_score INTEGER,
+    relevance INTEGER
+)
+LANGUAGE sql STABLE
+AS $$
+    WITH skill_filter AS (
+        SELECT
+            NULLIF(uniq(sort(COALESCE(p_skill_ids, '{}'))), '{}') AS ids,
+            (SELECT array_agg(DISTINCT lower(trim(f))) FROM unnest(p_skills) AS f) AS names
+    ), ranked AS (
+        SELECT
+            cs.*,
+            COALESCE(cardinality(cs.skill_ids & sf.ids), 0)
+              + CASE WHEN sf.names IS NULL THEN 0
+                     ELSE cardinality(ARRAY(SELECT unnest(cs.skill_names) INTERSECT SELECT unnest(sf.names)))
+                END AS relevance
+        FROM candidate_search cs
+        CROSS JOIN skill_filter sf
+        WHERE (p_major IS NULL OR cs.major_specialization ILIKE '%' || p_major || '%')
+          AND (p_location IS NULL OR cs.location ILIKE '%' || p_location || '%')
+          AND (p_graduation_year IS NULL OR cs.graduation_year = p_graduation_year)
+          AND (p_experience IS NULL OR cs.years_of_experience = p_experience)
+          AND ((sf.ids IS NULL AND sf.names IS NULL)
+               OR cs.skill_ids && sf.ids
+               OR cs.skill_names && sf.names)
+          AND cs.verified_avg_score >= COALESCE(p_min_skill_score, 0)
+    )
+    SELECT
+        r.user_id, r.full_name, r.professional_headline, r.location, r.major_specialization,
+        r.graduation_year, r.years_of_experience, r.top_skills, r.verified_avg_score, r.relevance
+    FROM ranked r
+    WHERE p_cursor_user_id IS NULL
+       OR (r.relevance, r.verified_avg_score, p_cursor_user_id)
+          < (p_cursor_relevance, p_cursor_score, r.user_id)
+    ORDER BY r.relevance DESC, r.verified_avg_score DESC, r.user_id ASC
+    LIMIT LEAST(GREATEST(COALESCE(p_limit, 20), 1), 100);
+$$;
+
+-- 10. Skill assessment question bank. Holds correct answers, so it is only
+-- read and written by the server with the service role key (no RLS policies).
+CREATE TABLE IF NOT EXISTS skill_questions (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    skill_key TEXT NOT NULL,  -- normalized skill name: lowercase, single spaces
+    skill_type TEXT CHECK (skill_type IN ('soft', 'technical')) NOT NULL,
+    prompt_version TEXT NOT NULL,
+    question_hash TEXT NOT NULL,
+    question JSONB NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW(),
+    UNIQUE (skill_key, skill_type, prompt_version, question_hash)
+);
+
+-- Most commonly listed skills, for pre-generating their question pools
+CREATE OR REPLACE FUNCTION popular_skills(p_limit INTEGER DEFAULT 50)
+RETURNS TABLE (skill_key TEXT, skill_type TEXT, users BIGINT)
+LANGUAGE sql STABLE SECURITY DEFINER SET search_path = public
+AS $$
+    SELECT lower(regexp_replace(trim(s.skill_name), '\s+', ' ', 'g')) AS skill_key, s.skill_type, COUNT(DISTINCT s.user_id)
+    FROM skills s
+    GROUP BY 1, 2
+    ORDER BY 3 DESC
+    LIMIT LEAST(GREATEST(COALESCE(p_limit, 50), 1), 1000);
+$$;
+
+REVOKE EXECUTE ON FUNCTION popular_skills(INTEGER) FROM PUBLIC, anon, authenticated;
+
+-- 11. CV embeddings for semantic candidate matching (see candidate_index.py).
+-- Vectors span every user's CVs, so only the server reads and writes them with
+-- the service role key (no RLS policies).
+CREATE TABLE IF NOT EXISTS cv_embeddings (
+    cv_id UUID REFERENCES cvs(id) ON DELETE CASCADE PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE NOT NULL,
+    model TEXT NOT NULL,
+    embedding TEXT NOT NULL,  -- base64 of little-endian float32
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+DROP INDEX IF EXISTS cv_embeddings_model_updated_idx;
+CREATE INDEX IF NOT EXISTS cv_embeddings_model_updated_cv_idx ON cv_embeddings (model, updated_at, cv_id);
+
+-- 12. Prompt versions behind each CV's results, so stale rows can be re-run after a
+-- prompt or model change (see reprocess.py). pdf_hash keys the cached OCR text.
+ALTER TABLE cvs ADD COLUMN IF NOT EXISTS pdf_hash TEXT;
+ALTER TABLE cvs ADD COLUMN IF NOT EXISTS structure_version TEXT;
+ALTER TABLE cvs ADD COLUMN IF NOT EXISTS score_version TEXT;
+
+-- 13. Raw OCR text of each CV (gzip, base64), read only when a CV is re-processed
+CREATE TABLE IF NOT EXISTS cv_texts (
+    cv_id UUID REFERENCES cvs(id) ON DELETE CASCADE PRIMARY KEY,
+    user_id UUID REFERENCES auth.users(id) ON DELETE CASCADE NOT NULL,
+    ocr_version TEXT NOT NULL,
+    encoding TEXT NOT NULL DEFAULT 'gzip',
+    content TEXT NOT NULL,
+    chars INTEGER NOT NULL,
+    created_at TIMESTAMPTZ DEFAULT NOW()
+);
+
+-- 14. CV list projection: the score as a plain column, so listing CVs doesn't
+-- transfer every score_data document, plus an index for keyset pagination
+ALTER TABLE cvs ADD COLUMN IF NOT EXISTS total_score INTEGER GENERATED ALWAYS AS (
+    CASE WHEN jsonb_typeof(score_data::jsonb -> 'total_score') = 'number'
+         THEN round((score_data::jsonb ->> 'total_score')::numeric)::integer
+    END
+) STORED;
+
+CREATE INDEX IF NOT EXISTS cvs_user_created_idx ON cvs (user_id, created_at DESC, id DESC);
+
 -- =============================================
 -- ROW LEVEL SECURITY (RLS) POLICIES
 -- =============================================
@@ -94,6 +425,12 @@ ALTER TABLE candidate_profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE employer_profiles ENABLE ROW LEVEL SECURITY;
 ALTER TABLE skills ENABLE ROW LEVEL SECURITY;
 ALTER TABLE certificates ENABLE ROW LEVEL SECURITY;
+ALTER TABLE candidate_search ENABLE ROW LEVEL SECURITY;
+ALTER TABLE skill_questions ENABLE ROW LEVEL SECURITY;
+ALTER TABLE skill_taxonomy ENABLE ROW LEVEL SECURITY;
+ALTER TABLE skill_aliases ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cv_embeddings ENABLE ROW LEVEL SECURITY;
+ALTER TABLE cv_texts ENABLE ROW LEVEL SECURITY;
 
 -- user_roles policies
 CREATE POLICY "Users can view own role" ON user_roles FOR SELECT USING (auth.uid() = user_id);
@@ -129,6 +466,20 @@ CREATE POLICY "Employers can view verified certificates" ON certificates FOR SEL
 );
 CREATE POLICY "Users can manage own certificates" ON certificates FOR ALL USING (auth.uid() = user_id);
 
+-- candidate_search policies (rows are written only by the SECURITY DEFINER refresh)
+CREATE POLICY "Employers can view candidate search" ON candidate_search FOR SELECT USING (
+    EXISTS (SELECT 1 FROM user_roles WHERE user_id = auth.uid() AND role = 'employer')
+);
+CREATE POLICY "Users can view own candidate search row" ON candidate_search FOR SELECT USING (auth.uid() = user_id);
+
+-- skill taxonomy policies (read-only reference data)
+CREATE POLICY "Anyone can view skill taxonomy" ON skill_taxonomy FOR SELECT USING (true);
+CREATE POLICY "Anyone can view skill aliases" ON skill_aliases FOR SELECT USING (true);
+
+-- cv_texts policies
+CREATE POLICY "Users can view own CV texts" ON cv_texts FOR SELECT USING (auth.uid() = user_id);
+CREATE POLICY "Users can manage own CV texts" ON cv_texts FOR ALL USING (auth.uid() = user_id);
+
 -- =============================================
 -- DONE! Your database is now set up for Jadeer
 -- =============================================
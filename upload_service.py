@@ -0,0 +1,83 @@
+import os
+import mmap
+import binascii
+import tempfile
+
+# Uploads larger than this are rejected before they are read
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_MB", "10")) * 1024 * 1024
+# Whole-request limit for batch uploads (many PDFs or one zip)
+MAX_BATCH_UPLOAD_BYTES = int(os.environ.get("MAX_BATCH_UPLOAD_MB", "200")) * 1024 * 1024
+# Allowance for multipart boundaries and form fields on top of the file size
+MULTIPART_OVERHEAD_BYTES = 64 * 1024
+
+_CHUNK_SIZE = 3 * 64 * 1024  # Multiple of 3 so base64 chunks concatenate without padding
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds MAX_UPLOAD_BYTES."""
+
+
+class SpooledPDF:
+    """An uploaded PDF spooled to a temp file and exposed as a read-only memory map.
+
+    The job, the OCR encoder, the cache hash and the storage upload all read
+    the same file-backed buffer instead of each holding its own bytes copy.
+    """
+
+    def __init__(self, stream, max_bytes=MAX_UPLOAD_BYTES):
+        fd, self.path = tempfile.mkstemp(suffix=".pdf")
+        self._mmap = None
+        self.size = 0
+        try:
+            with os.fdopen(fd, "wb") as f:
+                while True:
+                    chunk = stream.read(_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    self.size += len(chunk)
+                    if self.size > max_bytes:
+                        raise UploadTooLargeError(
+                            f"File is larger than the {max_bytes // (1024 * 1024)} MB limit")
+                    f.write(chunk)
+            if self.size == 0:
+                raise ValueError("Uploaded file is empty")
+            with open(self.path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except Exception:
+            self.close()
+            raise
+
+    @property
+    def buffer(self):
+        """Read-only memoryview over the whole file."""
+        return memoryview(self._mmap)
+
+    def close(self):
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # A memoryview is still alive; the map is freed with it
+                pass
+            self._mmap = None
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def pdf_data_uri(pdf_buffer):
+    """Build a base64 data URI from a bytes-like PDF, encoding chunk by chunk.
+
+    The encoded text is staged in a temp file and decoded straight from a
+    memory map, so the final str the API client needs is the only full-size
+    copy on the Python heap.
+    """
+    view = memoryview(pdf_buffer)
+    with tempfile.TemporaryFile() as staging:
+        staging.write(b"data:application/pdf;base64,")
+        for start in range(0, len(view), _CHUNK_SIZE):
+            staging.write(binascii.b2a_base64(view[start:start + _CHUNK_SIZE], newline=False))
+        staging.flush()
+        with mmap.mmap(staging.fileno(), 0, access=mmap.ACCESS_READ) as encoded:
+            return str(encoded, "ascii")